@@ -0,0 +1,130 @@
+"""
+Headless HTTP API for the interview pipeline.
+
+Exposes the same flow as app.py without Streamlit:
+
+    GET  /question?category=...   random interview question
+    POST /answer                  feedback, quality score and follow-up
+    POST /followup                feedback and score for a follow-up answer
+    POST /clarify                 clarification of a concept
+    GET  /healthz                 liveness, circuit breaker, follow-up paths and drafts, rate-limiter queues
+                                  and response-cache hit rate
+
+The service is stateless (the client sends back the question and follow-up
+it was given), so replicas can sit behind a plain load balancer. The
+generators, embedder, caches and HTTP connection pool are process-wide and
+shared by every request.
+
+The endpoints are async, but the LLM I/O behind them is not: each request
+runs the same blocking pipeline as app.py on a thread pool of
+API_WORKER_THREADS, sized together with the pipeline's own pool
+(PIPELINE_MAX_WORKERS). Concurrency is therefore bounded by those threads,
+not by the event loop. Moving the generators onto an async client would mean
+a second copy of llm.py, resilience.py and pipeline.py, so it was left out.
+
+Run with:
+    uvicorn api:app --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, Field
+from config import API_WORKER_THREADS, FOLLOWUP_DEADLINE_SECONDS, WARMUP_EMBEDDER
+from clarification_handler import generate_clarification, is_valid_clarification_question
+from followup_generator import warm_up_in_background
+from followup_policy import policy_report
+from pipeline import process_answer, process_followup_answer
+from rate_limiter import limiter_report
+from response_cache import cache_report
+from resilience import get_circuit_breaker
+from tracing import start_trace
+
+# The generators use the blocking OpenAI client; they run here so the event
+# loop never waits on them. This pool is separate from pipeline's so a request
+# thread waiting on pipeline futures can never starve the work it waits for.
+_request_executor = ThreadPoolExecutor(max_workers=API_WORKER_THREADS, thread_name_prefix="api")
+
+with open('data/questions.json', 'r') as f:
+    QUESTIONS = json.load(f)
+
+class AnswerRequest(BaseModel):
+    question: str = Field(min_length=1)
+    answer: str = Field(min_length=1)
+    iteration: int = Field(default=1, ge=1)
+    is_revision: bool = False
+
+class AnswerResponse(BaseModel):
+    feedback: str
+    quality_score: int
+    followup: str | None = None
+
+class FollowupRequest(BaseModel):
+    followup_question: str = Field(min_length=1)
+    followup_answer: str = Field(min_length=1)
+
+class FollowupResponse(BaseModel):
+    feedback: str
+    quality_score: int
+
+class ClarifyRequest(BaseModel):
+    question: str = Field(min_length=1)
+    answer: str = ""
+    student_question: str
+
+class ClarifyResponse(BaseModel):
+    clarification: str
+
+async def _run(trace_name, fn, *args, **kwargs):
+    """Run a blocking pipeline call on the request pool, traced like the Streamlit actions"""
+    def traced():
+        with start_trace(trace_name):
+            return fn(*args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_request_executor, traced)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load the embedder before the first request needs it
+    if WARMUP_EMBEDDER:
+        warm_up_in_background()
+    yield
+    _request_executor.shutdown(wait=False)
+
+app = FastAPI(title="Data Science Interview Prep API", lifespan=lifespan)
+
+@app.get("/healthz")
+async def healthz():
+    followups = policy_report()
+    return {"status": "ok", "circuit": get_circuit_breaker().state, "followup_paths": followups["paths"],
+            "followup_drafts": followups["drafts"], "rate_limiter": limiter_report(), "response_cache": cache_report()}
+
+@app.get("/question")
+async def get_question(category: str | None = None):
+    candidates = [q for q in QUESTIONS if category is None or q["category"] == category]
+    if not candidates:
+        raise HTTPException(status_code=404, detail=f"No questions in category '{category}'")
+    return random.choice(candidates)
+
+@app.post("/answer", response_model=AnswerResponse)
+async def submit_answer(request: AnswerRequest):
+    result = await _run("submit_answer", process_answer, request.question, request.answer,
+                        iteration=request.iteration, is_revision=request.is_revision,
+                        deadline=time.monotonic() + FOLLOWUP_DEADLINE_SECONDS)
+    return AnswerResponse(**result)
+
+@app.post("/followup", response_model=FollowupResponse)
+async def submit_followup(request: FollowupRequest):
+    feedback, quality_score = await _run("submit_followup", process_followup_answer,
+                                         request.followup_question, request.followup_answer)
+    return FollowupResponse(feedback=feedback, quality_score=quality_score)
+
+@app.post("/clarify", response_model=ClarifyResponse)
+async def clarify(request: ClarifyRequest):
+    if not is_valid_clarification_question(request.student_question):
+        raise HTTPException(status_code=422, detail="Please ask a specific question about the concept.")
+    clarification = await _run("clarification", generate_clarification,
+                               request.question, request.answer, request.student_question)
+    return ClarifyResponse(clarification=clarification)
@@ -1,14 +1,20 @@
 import streamlit as st
 import json
 import random
+import time
 from config import *
-from feedback_generator import generate_feedback, evaluate_answer_quality
-from followup_generator import generate_followup_question
-from clarification_handler import generate_clarification, is_valid_clarification_question
+from pipeline import process_answer, process_followup_answer
+from followup_generator import warm_up_in_background
+from clarification_handler import generate_clarification_stream, is_valid_clarification_question
+from tracing import record_trace, recent_traces, start_trace
 
 st.title("Data Science Interview Prep Agent")
 st.write("Practice technical questions with AI feedback")
 
+# Preload the embedder while the user picks a category (no-op once started)
+if WARMUP_EMBEDDER:
+    warm_up_in_background()
+
 # Load questions
 @st.cache_data
 def load_questions():
@@ -29,6 +35,19 @@ if "current_followup" not in st.session_state:
     st.session_state.current_followup = None
 if "current_thread" not in st.session_state:
     st.session_state.current_thread = []
+if "trace_ids" not in st.session_state:
+    st.session_state.trace_ids = []
+
+def remember_trace(trace):
+    """Keep this session's trace ids for the debug panel"""
+    if trace is not None:
+        st.session_state.trace_ids = (st.session_state.trace_ids + [trace.trace_id])[-TRACE_RECENT_LIMIT:]
+
+def rerun_after(trace):
+    """st.rerun(), timing the rerun that follows as its own trace"""
+    remember_trace(trace)
+    st.session_state.rerun_started = (time.time(), time.perf_counter(), trace.trace_id if trace else None)
+    st.rerun()
 
 # Category selection
 selected_category = st.selectbox(
@@ -89,30 +108,21 @@ if st.session_state.selected_question:
     
     if st.button("Submit Answer") and user_answer.strip():
         with st.spinner("Generating feedback..."):
-            # Generate feedback
-            feedback = generate_feedback(
-                st.session_state.selected_question['question'], 
-                user_answer,
-                iteration=len(st.session_state.current_thread) + 1
-            )
-            
-            # Evaluate quality
-            quality_score = evaluate_answer_quality(
-                st.session_state.selected_question['question'],
-                user_answer
-            )
-            
-            # Generate follow-up if appropriate
+            # Feedback streams in while scoring runs concurrently; follow-up starts once the score is known
             is_revision = len(st.session_state.current_thread) > 0
-            followup_question = None
-            if quality_score >= 3 or is_revision:
-                followup_question = generate_followup_question(
-                    st.session_state.selected_question['question'],
-                    user_answer,
-                    feedback,
-                    quality_score,
-                    is_revision=is_revision
-                )
+            with start_trace("submit_answer", is_revision=is_revision) as trace:
+                with st.chat_message("assistant"):
+                    result = process_answer(
+                        st.session_state.selected_question['question'],
+                        user_answer,
+                        iteration=len(st.session_state.current_thread) + 1,
+                        is_revision=is_revision,
+                        render_feedback=st.write_stream,
+                        deadline=time.monotonic() + FOLLOWUP_DEADLINE_SECONDS
+                    )
+            feedback = result["feedback"]
+            quality_score = result["quality_score"]
+            followup_question = result["followup"]
             
             # Add to current thread
             thread_entry = {
@@ -131,7 +141,7 @@ if st.session_state.selected_question:
                 **thread_entry
             })
             
-            st.rerun()
+            rerun_after(trace)
 
 # Follow-up answer section - only show if there's a pending follow-up
 if (st.session_state.current_thread and 
@@ -151,8 +161,11 @@ if (st.session_state.current_thread and
         if st.button("Submit Follow-up"):
             if followup_answer.strip():
                 with st.spinner("Analyzing follow-up..."):
-                    followup_feedback = generate_feedback(current_followup, followup_answer)
-                    followup_quality = evaluate_answer_quality(current_followup, followup_answer)
+                    with start_trace("submit_followup") as trace:
+                        with st.chat_message("assistant"):
+                            followup_feedback, followup_quality = process_followup_answer(
+                                current_followup, followup_answer, render_feedback=st.write_stream
+                            )
                     
                     # Update the last thread entry with follow-up info
                     st.session_state.current_thread[-1]['followup_answer'] = followup_answer
@@ -165,7 +178,7 @@ if (st.session_state.current_thread and
                         st.session_state.conversation_history[-1]['followup_feedback'] = followup_feedback
                         st.session_state.conversation_history[-1]['followup_quality'] = followup_quality
                     
-                    st.rerun()
+                    rerun_after(trace)
                     
     with col2:
         if st.button("Skip Follow-up"):
@@ -187,26 +200,22 @@ if st.session_state.current_thread:
     
     if st.button("Ask Question") and student_question.strip():
         with st.spinner("Providing clarification..."):
-            # Get relevant knowledge base context
-            from knowledge_base import get_feedback_context
-            context = get_feedback_context(st.session_state.selected_question['question'])
-            
             # Reference their most recent answer for context
             recent_answer = st.session_state.current_thread[-1]['answer']
             
-            # Generate clarification
-            clarification = generate_clarification(
-                st.session_state.selected_question['question'],
-                recent_answer,
-                student_question
-            )
-            
-            # Display in chat format
+            # Display in chat format, streaming the clarification as it is generated
             with st.chat_message("user"):
                 st.write(f"**Your Question:** {student_question}")
             
-            with st.chat_message("assistant"):
-                st.write(f"**Clarification:** {clarification}")
+            with start_trace("clarification") as trace:
+                with st.chat_message("assistant"):
+                    st.write("**Clarification:**")
+                    clarification = st.write_stream(generate_clarification_stream(
+                        st.session_state.selected_question['question'],
+                        recent_answer,
+                        student_question
+                    ))
+            remember_trace(trace)
             
             # Optional: Add to thread for persistence
             clarification_entry = {
@@ -258,4 +267,29 @@ if st.session_state.conversation_history:
         st.session_state.selected_question = None
         st.session_state.current_thread = []
         st.session_state.current_followup = None
-        st.rerun()
\ No newline at end of file
+        st.rerun()
+
+# Time the rerun triggered by the last action (its script run ends here)
+if "rerun_started" in st.session_state:
+    started_at, started, parent_trace_id = st.session_state.pop("rerun_started")
+    remember_trace(record_trace("streamlit.rerun", started_at, time.perf_counter() - started,
+                                follows_trace=parent_trace_id))
+
+# Optional debug panel: this session's last request waterfalls
+if SHOW_TRACE_PANEL and st.session_state.trace_ids:
+    with st.expander("Debug: request traces", expanded=False):
+        session_traces = [trace for trace in recent_traces() if trace.trace_id in st.session_state.trace_ids]
+        for trace in reversed(session_traces):
+            rows = trace.waterfall()
+            total_ms = max((offset + (duration or 0) for _, offset, duration, _, _ in rows), default=0) or 1
+            st.write(f"**{trace.name}** - {total_ms:.0f} ms")
+            lines = []
+            for name, offset, duration, depth, attributes in rows:
+                bar_start = int(40 * offset / total_ms)
+                bar_width = max(1, int(40 * (duration or 0) / total_ms))
+                tokens = ""
+                if "prompt_tokens" in attributes:
+                    tokens = f" [{attributes['prompt_tokens']}+{attributes['completion_tokens']} tok]"
+                lines.append(f"{'  ' * depth + name:<28} {' ' * bar_start}{'#' * bar_width:<{41 - bar_start}} "
+                             f"{duration or 0:>8.1f} ms{tokens}")
+            st.code("\n".join(lines), language=None)
@@ -0,0 +1,242 @@
+"""
+End-to-end benchmark of the submit path against the local mock OpenAI server.
+
+Starts mock_openai_server.py in a subprocess and drives whole sessions
+(feedback -> score -> follow-up -> follow-up feedback -> clarification)
+through pipeline.py at the requested concurrency. It reports p50/p95/p99
+latency per stage, session throughput, peak RSS, FollowupGenerator
+construction time and embedder encode time. Results are written as JSON
+named after the current commit so runs can be compared across commits.
+
+Usage:
+    python benchmark.py [--sessions 50] [--concurrency 8] [--latency-ms 300] [--jitter-ms 100]
+                        [--failure-rate 0.0] [--cache] [--rate-limit] [--out data/benchmarks] [--compare previous.json]
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+CLARIFICATION_QUESTIONS = [
+    "Can you give a concrete example of this?",
+    "How would I explain this in simpler terms?",
+    "What is the most common mistake people make here?"
+]
+
+def percentiles(values):
+    """p50/p95/p99/mean in milliseconds for a list of durations in seconds"""
+    if not values:
+        return {"count": 0}
+    ms = np.array(values) * 1000
+    return {
+        "count": len(values),
+        "p50": round(float(np.percentile(ms, 50)), 2),
+        "p95": round(float(np.percentile(ms, 95)), 2),
+        "p99": round(float(np.percentile(ms, 99)), 2),
+        "mean": round(float(ms.mean()), 2)
+    }
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_mock_server(args):
+    """Run the mock server in its own process (so it doesn't share our GIL) and wait until it answers"""
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_openai_server.py"),
+        "--port", str(port), "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--failure-rate", str(args.failure_rate), "--seed", str(args.seed)
+    ], stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}/v1"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(urllib.request.Request(f"{base_url}/health", method="POST"), timeout=1)
+        except urllib.error.HTTPError:
+            return process, base_url  # the server is up (and rightly 404s the probe)
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Mock OpenAI server did not start")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def measure_embedder(generator, questions, repeats=20):
+    """Batched and single-query encode times for the follow-up embedder (None without a model)"""
+    if not generator.embedder.can_encode:
+        return None
+    texts = [f"{q['question']} I would start by defining the key terms." for q in questions]
+    generator.embedder.encode(texts[:1], normalize_embeddings=True)  # first call pays one-off setup
+
+    single = []
+    for i in range(repeats):
+        started = time.perf_counter()
+        generator.embedder.encode([texts[i % len(texts)]], normalize_embeddings=True)
+        single.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    generator.embedder.encode(texts, normalize_embeddings=True)
+    batch = time.perf_counter() - started
+    return {"single_query": percentiles(single), "batch_ms": round(batch * 1000, 2), "batch_size": len(texts)}
+
+def measure_retrieval(generator, questions, repeats=50):
+    """retrieve_relevant_patterns and follow-up prompt building, without the LLM"""
+    retrieval, prompt_build = [], []
+    for i in range(repeats):
+        question = questions[i % len(questions)]["question"]
+        answer = "It depends on the data; I would validate on a holdout set."
+        started = time.perf_counter()
+        generator.retrieve_relevant_patterns(question, answer, "gap_filling", top_k=3)
+        retrieval.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        generator.build_followup_messages(question, answer, "gap_filling", 3, "You are missing an example.")
+        prompt_build.append(time.perf_counter() - started)
+    return {"retrieve_relevant_patterns": percentiles(retrieval), "build_followup_messages": percentiles(prompt_build)}
+
+def run_session(session_id, questions):
+    """One full interview turn; returns {stage: seconds} and whether any stage fell back to an error"""
+    from pipeline import process_answer, process_followup_answer
+    from clarification_handler import generate_clarification
+
+    question = questions[session_id % len(questions)]["question"]
+    answer = f"My answer to '{question}': I would define the terms, give an example and discuss trade-offs."
+    timings = {}
+    started = time.perf_counter()
+
+    stage_started = time.perf_counter()
+    result = process_answer(question, answer)
+    timings["submit_answer"] = time.perf_counter() - stage_started
+    errors = int(result["feedback"].startswith("Error"))
+
+    if result["followup"]:
+        stage_started = time.perf_counter()
+        followup_feedback, _ = process_followup_answer(result["followup"], "I would monitor drift and retrain.")
+        timings["submit_followup"] = time.perf_counter() - stage_started
+        errors += int(followup_feedback.startswith("Error"))
+
+    stage_started = time.perf_counter()
+    clarification = generate_clarification(question, answer, CLARIFICATION_QUESTIONS[session_id % len(CLARIFICATION_QUESTIONS)])
+    timings["clarification"] = time.perf_counter() - stage_started
+    errors += int(clarification.startswith("Error"))
+
+    timings["session"] = time.perf_counter() - started
+    return timings, errors
+
+def compare(current, previous_path):
+    """Print p50/p95 and throughput changes against an earlier result file"""
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nCompared with {previous.get('commit')} ({previous_path}):")
+    for stage, stats in current["stages"].items():
+        before = previous.get("stages", {}).get(stage)
+        if not before or not stats.get("count") or not before.get("count"):
+            continue
+        deltas = ", ".join(f"{key} {before[key]:.1f} -> {stats[key]:.1f} ms ({(stats[key] - before[key]) / before[key]:+.1%})"
+                           for key in ("p50", "p95") if before[key])
+        print(f"  {stage:<16} {deltas}")
+    before, after = previous.get("throughput_sessions_per_s"), current["throughput_sessions_per_s"]
+    if before:
+        print(f"  {'throughput':<16} {before:.2f} -> {after:.2f} sessions/s ({(after - before) / before:+.1%})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the submit path against a local mock LLM server")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8, help="Sessions running at once")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Mock server mean latency")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="Mock server latency standard deviation")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of mock requests failing with 429/5xx")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="Leave the response cache on (off by default)")
+    parser.add_argument("--rate-limit", action="store_true", help="Leave the RPM/TPM limiter on (off by default)")
+    parser.add_argument("--out", default="data/benchmarks", help="Directory for the JSON result")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(args)
+    try:
+        # config reads these at import time, so set them before importing the app modules
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ.setdefault("OPENAI_API_KEY", "mock")
+        if not args.cache:
+            os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+        if not args.rate_limit:
+            # The mock server has no quota; the limiter would only cap throughput at RATE_LIMIT_RPM
+            os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+        with open("data/questions.json") as f:
+            questions = json.load(f)
+
+        started = time.perf_counter()
+        from followup_generator import get_followup_generator
+        generator = get_followup_generator()
+        construction = time.perf_counter() - started
+
+        embedder = measure_embedder(generator, questions)
+        retrieval = measure_retrieval(generator, questions)
+
+        stage_timings, errors = {}, 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as sessions:
+            for timings, session_errors in sessions.map(lambda i: run_session(i, questions), range(args.sessions)):
+                errors += session_errors
+                for stage, seconds in timings.items():
+                    stage_timings.setdefault(stage, []).append(seconds)
+        wall = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    from followup_policy import policy_report
+    from rate_limiter import limiter_report
+    from response_cache import cache_report
+    from token_budget import usage_report
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "stages": {stage: percentiles(values) for stage, values in stage_timings.items()},
+        "throughput_sessions_per_s": round(args.sessions / wall, 3),
+        "wall_seconds": round(wall, 3),
+        "fallback_errors": errors,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),  # KiB on Linux
+        "generator_construction_ms": round(construction * 1000, 2),
+        "embedder_encode": embedder,
+        "retrieval": retrieval,
+        "followup_paths": policy_report()["paths"],
+        "followup_drafts": policy_report()["drafts"],
+        "rate_limiter": limiter_report(),
+        "response_cache": cache_report(),
+        "token_usage": usage_report()
+    }
+
+    os.makedirs(args.out, exist_ok=True)
+    out_path = os.path.join(args.out, f"{datetime.now():%Y%m%d-%H%M%S}-{result['commit']}.json")
+    with open(out_path, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"{args.sessions} sessions at concurrency {args.concurrency}: "
+          f"{result['throughput_sessions_per_s']} sessions/s, peak RSS {result['peak_rss_mb']} MB")
+    for stage, stats in result["stages"].items():
+        print(f"  {stage:<16} p50 {stats['p50']:>8.1f} ms  p95 {stats['p95']:>8.1f} ms  p99 {stats['p99']:>8.1f} ms")
+    print(f"Saved {out_path}")
+    if args.compare:
+        compare(result, args.compare)
+
+if __name__ == "__main__":
+    main()
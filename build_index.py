@@ -0,0 +1,39 @@
+"""
+Build the retrieval index artifact offline so workers never encode the pattern bank.
+
+Usage:
+    python build_index.py [--out artifacts/index] [--backend torch]
+    python build_index.py --verify [--out artifacts/index]
+"""
+import argparse
+import sys
+from config import EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, INDEX_ARTIFACT_DIR
+from embeddings import load_embedder
+from index_artifact import build_artifact, verify_artifact
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the follow-up retrieval index artifact")
+    parser.add_argument("--out", default=INDEX_ARTIFACT_DIR, help="Artifact directory")
+    parser.add_argument("--patterns", default="data/followup_patterns.json")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, help="Embedding backend the app will run with")
+    parser.add_argument("--verify", action="store_true", help="Check an existing artifact against its manifest")
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatched = verify_artifact(args.out)
+        if mismatched:
+            print(f"Artifact files changed since build: {', '.join(mismatched)}")
+            sys.exit(1)
+        print(f"Artifact in {args.out} matches its manifest")
+        return
+
+    embedder = load_embedder(args.model, args.backend)
+    if not embedder.can_encode:
+        parser.error(f"Backend '{args.backend}' has no model to encode patterns with")
+
+    manifest = build_artifact(args.out, args.patterns, embedder, args.model, args.backend)
+    print(f"Wrote {manifest['n_patterns']} patterns ({manifest['embedding_dim']}-d) to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Record/replay transport for the shared OpenAI client.
+
+In record mode every request goes to the real transport and its response is
+appended to a cassette: a JSONL file with one line per distinct response,
+indexed by request key (the SHA-256 of the method, path and canonical JSON
+body; headers such as the API key are not part of it). Transient failures
+(429/5xx) are not recorded. In replay mode responses come from the cassette's
+in-memory index without touching the network, optionally after sleeping for
+the latency recorded with them. Requests missing from the cassette get a 404
+error response, which the callers treat like any other provider error.
+
+Set OPENAI_CASSETTE_MODE=record|replay and OPENAI_CASSETTE_PATH to use it
+with the app, benchmark.py or any other entry point.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import httpx
+
+class Cassette:
+    """Recorded responses indexed by request key; record() appends to the file as it goes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._replays = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entry["content"] = entry["content"].encode()
+                        self._entries.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+    @staticmethod
+    def request_key(request):
+        """Deterministic key for a request: method, path and body with JSON keys sorted"""
+        body = request.content
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+        except ValueError:
+            pass
+        return hashlib.sha256(b"\n".join([request.method.encode(), request.url.path.encode(), body])).hexdigest()
+
+    def lookup(self, key):
+        """The next recorded entry for key (cycling through repeats), or None"""
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            index = self._replays.get(key, 0)
+            self._replays[key] = index + 1
+            return entries[index % len(entries)]
+
+    def record(self, key, status_code, content_type, content, latency):
+        """Append a response, skipping exact repeats so the cassette stays compact"""
+        entry = {"key": key, "status_code": status_code, "content_type": content_type,
+                 "latency": round(latency, 4), "content": content.decode()}
+        with self._lock:
+            if any(existing["content"] == content for existing in self._entries.get(key, [])):
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._entries.setdefault(key, []).append({**entry, "content": content})
+
+def _replayed_response(entry, request):
+    return httpx.Response(entry["status_code"], headers={"content-type": entry["content_type"]},
+                          content=entry["content"], request=request)
+
+def _missing_response(key, request):
+    return httpx.Response(404, json={"error": {"message": f"No cassette entry for request {key[:12]}",
+                                               "type": "cassette_miss"}}, request=request)
+
+class CassetteTransport(httpx.BaseTransport):
+    """
+    Sync httpx transport that records to or replays from a Cassette.
+
+    Recording reads each response in full before returning it, so streamed
+    completions arrive in one piece while recording (replay is unaffected).
+    """
+
+    def __init__(self, cassette, mode, transport=None, simulate_latency=False):
+        self.cassette = cassette
+        self.mode = mode
+        self.transport = transport
+        self.simulate_latency = simulate_latency
+
+    def handle_request(self, request):
+        request.read()
+        key = Cassette.request_key(request)
+        if self.mode == "replay":
+            entry = self.cassette.lookup(key)
+            if entry is None:
+                return _missing_response(key, request)
+            if self.simulate_latency:
+                time.sleep(entry["latency"])
+            return _replayed_response(entry, request)
+
+        started = time.perf_counter()
+        response = self.transport.handle_request(request)
+        content = response.read()
+        latency = time.perf_counter() - started
+        response.close()
+        content_type = response.headers.get("content-type", "application/json")
+        if response.status_code != 429 and response.status_code < 500:
+            self.cassette.record(key, response.status_code, content_type, content, latency)
+        return httpx.Response(response.status_code, headers={"content-type": content_type},
+                              content=content, request=request)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+def get_cassette(path):
+    """One Cassette per file, shared by every client using it"""
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
@@ -1,5 +1,43 @@
-from config import client, MODEL_NAME
-from knowledge_base import get_feedback_context
+from config import ANSWER_TOKEN_BUDGET, CLARIFICATION_QUESTION_TOKEN_BUDGET
+from llm import chat_completion, chat_completion_stream
+from knowledge_retrieval import get_clarification_context
+from token_budget import truncate_to_budget
+from tracing import span
+
+def _fit_to_budget(student_answer, student_question):
+    """Trim the free-text inputs to their prompt token budgets"""
+    return (truncate_to_budget(student_answer, ANSWER_TOKEN_BUDGET),
+            truncate_to_budget(student_question, CLARIFICATION_QUESTION_TOKEN_BUDGET))
+
+def _clarification_messages(original_question, student_answer, student_question):
+    """Build the chat messages for a clarification request"""
+    # Only the knowledge-base chunks relevant to what the student asked
+    with span("clarification_context"):
+        context = get_clarification_context(original_question, student_question)
+    
+    clarification_prompt = f"""
+    You are a patient data science tutor helping a student understand concepts.
+    
+    ORIGINAL INTERVIEW QUESTION: {original_question}
+    THEIR RECENT ANSWER: {student_answer}
+    STUDENT'S QUESTION: {student_question}
+    
+    RELEVANT KNOWLEDGE:
+    {context}
+    
+    Provide a clear, helpful explanation that:
+    1. Directly answers their specific question
+    2. Uses concrete examples
+    3. References their previous answer to build understanding
+    4. Keeps it concise and interview-focused
+    
+    Be conversational and supportive.
+    """
+    
+    return [
+        {"role": "system", "content": "You are a supportive data science tutor who gives clear explanations with examples."},
+        {"role": "user", "content": clarification_prompt}
+    ]
 
 def generate_clarification(original_question, student_answer, student_question):
     """
@@ -13,44 +51,41 @@ def generate_clarification(original_question, student_answer, student_question):
     Returns:
         str: Clarification response
     """
+    student_answer, student_question = _fit_to_budget(student_answer, student_question)
     try:
-        # Get relevant knowledge base context
-        context = get_feedback_context(original_question)
-        
-        clarification_prompt = f"""
-        You are a patient data science tutor helping a student understand concepts.
-        
-        ORIGINAL INTERVIEW QUESTION: {original_question}
-        THEIR RECENT ANSWER: {student_answer}
-        STUDENT'S QUESTION: {student_question}
-        
-        RELEVANT KNOWLEDGE:
-        {context}
-        
-        Provide a clear, helpful explanation that:
-        1. Directly answers their specific question
-        2. Uses concrete examples
-        3. References their previous answer to build understanding
-        4. Keeps it concise and interview-focused
-        
-        Be conversational and supportive.
-        """
-        
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": "You are a supportive data science tutor who gives clear explanations with examples."},
-                {"role": "user", "content": clarification_prompt}
-            ],
+        return chat_completion(
+            messages=_clarification_messages(original_question, student_answer, student_question),
             max_tokens=500,
-            temperature=0.7
+            temperature=0.7,
+            call_site="clarification",
+            cache=True,
+            semantic_text=student_question
         )
         
-        return response.choices[0].message.content
-        
     except Exception as e:
         return f"Error providing clarification: {str(e)}"
 
+def generate_clarification_stream(original_question, student_answer, student_question):
+    """
+    Streaming variant of generate_clarification.
+    
+    Yields:
+        str: Chunks of the clarification response as they arrive
+    """
+    student_answer, student_question = _fit_to_budget(student_answer, student_question)
+    try:
+        yield from chat_completion_stream(
+            messages=_clarification_messages(original_question, student_answer, student_question),
+            max_tokens=500,
+            temperature=0.7,
+            call_site="clarification",
+            cache=True,
+            semantic_text=student_question
+        )
+        
+    except Exception as e:
+        yield f"Error providing clarification: {str(e)}"
+
 def is_valid_clarification_question(question):
     """
     Basic validation for clarification questions.
@@ -1,6 +1,6 @@
 import os
+import threading
 from dotenv import load_dotenv
-from openai import OpenAI
 
 load_dotenv()
 
@@ -9,14 +9,170 @@ MODEL_NAME = "gpt-4o-mini"
 MAX_TOKENS = 250
 TEMPERATURE = 0.7
 
+# Embedding configuration
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch | onnx | onnx-int8 | precomputed (the onnx backends are experimental, see embeddings.py)
+EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "data/cache")
+INDEX_ARTIFACT_DIR = os.getenv("INDEX_ARTIFACT_DIR", "artifacts/index")  # built by build_index.py
+
+# Follow-up pattern retrieval index: numpy (exact brute force), faiss-flat, faiss-ivf or faiss-hnsw
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "numpy")
+ANN_MIN_ROWS = 1024  # smaller (sub-)indexes always use exact search
+FAISS_IVF_NLIST = 100
+FAISS_IVF_NPROBE = 8
+FAISS_HNSW_M = 32
+FAISS_HNSW_EF_SEARCH = 64
+RETRIEVAL_CANDIDATE_FACTOR = 10  # approximate backends re-rank top_k * factor candidates
+
+# Start loading the embedder in the background as soon as the app renders
+WARMUP_EMBEDDER = os.getenv("WARMUP_EMBEDDER", "true").lower() == "true"
+
+# Knowledge-base retrieval for clarifications
+CLARIFICATION_CONTEXT_TOP_K = 4
+KB_CONCEPT_BOOST = 0.1  # added to cosine similarity for chunks from the question's own concept
+
+# Prompt input budgets in tokens; longer text is trimmed in the middle (see token_budget.py)
+ANSWER_TOKEN_BUDGET = 600
+FEEDBACK_TOKEN_BUDGET = 300
+CLARIFICATION_QUESTION_TOKEN_BUDGET = 200
+PATTERN_CONTEXT_TOKEN_BUDGET = 200
+# Tokens a process may spend per rolling window before follow-ups take the pattern path
+PROCESS_TOKEN_BUDGET = int(os.getenv("PROCESS_TOKEN_BUDGET", "0"))  # 0 = unlimited
+PROCESS_TOKEN_BUDGET_WINDOW_SECONDS = float(os.getenv("PROCESS_TOKEN_BUDGET_WINDOW_SECONDS", "3600"))
+
+# Follow-up policy: serve the best retrieved pattern instead of calling the LLM when degraded
+FOLLOWUP_POLICY_ENABLED = os.getenv("FOLLOWUP_POLICY_ENABLED", "true").lower() == "true"
+FOLLOWUP_LATENCY_SLO_SECONDS = float(os.getenv("FOLLOWUP_LATENCY_SLO_SECONDS", "4.0"))  # p95 over the window
+FOLLOWUP_ERROR_RATE_THRESHOLD = 0.5
+FOLLOWUP_POLICY_WINDOW_SECONDS = 60.0
+FOLLOWUP_POLICY_MIN_SAMPLES = 5  # fewer calls in the window never trip the latency/error conditions
+# Seconds from "Submit Answer" until its follow-up is needed; past it the best stored pattern is served
+FOLLOWUP_DEADLINE_SECONDS = float(os.getenv("FOLLOWUP_DEADLINE_SECONDS", "20"))
+
+# Answer-submission pipeline
+# Threads serving blocking pipeline calls in the HTTP API (api.py)
+API_WORKER_THREADS = int(os.getenv("API_WORKER_THREADS", "16"))
+# A submit keeps up to three pipeline tasks in flight (score, feedback and a
+# speculative draft), so the pool is sized for every API request thread to get
+# them without queueing. The default (48) stays under OPENAI_MAX_CONNECTIONS.
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", str(3 * API_WORKER_THREADS)))
+# One structured completion for feedback + score instead of two calls
+COMBINED_FEEDBACK_SCORING = os.getenv("COMBINED_FEEDBACK_SCORING", "false").lower() == "true"
+# Draft the follow-up while feedback and scoring are in flight; the draft is
+# used only if the real follow-up type matches, otherwise it is discarded.
+# determine_followup_type gives gap_filling only for a score of 3 (unless the
+# feedback calls the answer unclear), so the draft hit rate is roughly the share
+# of answers scoring 3; every other draft is a paid call thrown away. Check
+# policy_report()["drafts"] (used vs discarded) before turning this on.
+SPECULATIVE_FOLLOWUP = os.getenv("SPECULATIVE_FOLLOWUP", "false").lower() == "true"
+SPECULATIVE_FOLLOWUP_TYPE = os.getenv("SPECULATIVE_FOLLOWUP_TYPE", "gap_filling")
+
+# LLM response cache
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400"))
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "false").lower() == "true"
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = 0.97  # cosine similarity of the varying text (e.g. the answer)
+
+# Tracing (tracing.py): per-request spans, exported as JSONL or to OpenTelemetry
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "none")  # none | jsonl | otel
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "data/traces/traces.jsonl")
+TRACE_RECENT_LIMIT = 20  # finished traces kept in memory for the debug panel
+SHOW_TRACE_PANEL = os.getenv("SHOW_TRACE_PANEL", "false").lower() == "true"
+
 # OpenAI API
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # e.g. the local mock server; None = api.openai.com
+
+# HTTP connection pool shared by every OpenAI call (keep-alive avoids repeat TLS handshakes)
+HTTP_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = 30.0  # seconds an idle socket is kept open
+HTTP_CONNECT_TIMEOUT = 5.0
+HTTP_READ_TIMEOUT = 60.0
+
+# Retries, deadlines and circuit breaker for OpenAI calls (resilience.py; the SDK's own retries are off)
+LLM_CALL_DEADLINE_SECONDS = float(os.getenv("LLM_CALL_DEADLINE_SECONDS", "30"))  # whole call, retries included
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_RETRY_BASE_SECONDS = 0.5
+LLM_RETRY_MAX_SECONDS = 8.0
+CIRCUIT_FAILURE_THRESHOLD = 5  # consecutive 429/5xx/timeouts before failing fast
+CIRCUIT_RESET_SECONDS = 30.0
+
+# Global rate limiter for LLM calls (rate_limiter.py); defaults match gpt-4o-mini tier-1 limits
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_RPM = int(os.getenv("RATE_LIMIT_RPM", "500"))
+RATE_LIMIT_TPM = int(os.getenv("RATE_LIMIT_TPM", "200000"))
+RATE_LIMIT_BURST_SECONDS = 10.0  # buckets hold this many seconds' worth of the per-minute rate
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "20"))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | sqlite (shared by processes on a host)
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "data/cache/rate_limit.sqlite")
+# Priority class per call site (lower goes first); interactive feedback ahead of follow-ups and clarifications
+LLM_CALL_PRIORITIES = {"feedback": 0, "quality_score": 0, "feedback_and_score": 0, "followup": 1, "clarification": 1}
+DEFAULT_CALL_PRIORITY = 1
+BULK_CALL_PRIORITY = 2  # offline grading (grade.py)
+
+# Record/replay of OpenAI traffic (cassette.py): off | record | replay
+OPENAI_CASSETTE_MODE = os.getenv("OPENAI_CASSETTE_MODE", "off")
+OPENAI_CASSETTE_PATH = os.getenv("OPENAI_CASSETTE_PATH", "data/cassettes/openai.jsonl")
+OPENAI_CASSETTE_SIMULATE_LATENCY = os.getenv("OPENAI_CASSETTE_SIMULATE_LATENCY", "false").lower() == "true"
+
+_client = None
+_client_lock = threading.Lock()
+
+# openai/httpx are imported on first client use so importing config stays cheap
+
+def _http_limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+
+def _http_timeout():
+    import httpx
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+def _http_transport():
+    """Cassette transport over a pooled transport when record/replay is on, else None (httpx default)"""
+    if OPENAI_CASSETTE_MODE == "off":
+        return None
+    import httpx
+    from cassette import CassetteTransport, get_cassette
+    if OPENAI_CASSETTE_MODE not in ("record", "replay"):
+        raise ValueError(f"Unknown OPENAI_CASSETTE_MODE: {OPENAI_CASSETTE_MODE}")
+    cassette = get_cassette(OPENAI_CASSETTE_PATH)
+    return CassetteTransport(cassette, OPENAI_CASSETTE_MODE, httpx.HTTPTransport(limits=_http_limits()),
+                             OPENAI_CASSETTE_SIMULATE_LATENCY)
+
+def _warn_if_missing_key():
+    if not OPENAI_API_KEY:
+        print("OPENAI_API_KEY not found in environment variables")
 
-# Centralized OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+def get_client():
+    """Return the process-wide synchronous OpenAI client"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import httpx
+                from openai import OpenAI
+                _warn_if_missing_key()
+                _client = OpenAI(
+                    api_key=OPENAI_API_KEY,
+                    base_url=OPENAI_BASE_URL,
+                    timeout=_http_timeout(),
+                    max_retries=0,
+                    http_client=httpx.Client(limits=_http_limits(), timeout=_http_timeout(), transport=_http_transport())
+                )
+    return _client
 
-# Debug check (remove after testing)
-if not OPENAI_API_KEY:
-    print("OPENAI_API_KEY not found in environment variables")
-else:
-    print("OpenAI client initialised successfully")
\ No newline at end of file
+def __getattr__(name):
+    # Centralized OpenAI client, kept for existing `from config import client`
+    # imports; built on first access and the same instance as get_client()
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
@@ -0,0 +1,151 @@
+"""
+Sentence embedding backends for follow-up pattern retrieval.
+
+Select one with EMBEDDING_BACKEND:
+
+- "torch": SentenceTransformer on PyTorch. This is the reference backend.
+- "onnx" (experimental): the same MiniLM weights run by ONNX Runtime with a
+  Rust tokenizer. No torch in the process, which saves several hundred MB of
+  RSS per worker.
+- "onnx-int8" (experimental): the dynamically int8-quantized ONNX export of
+  the model, which is smaller and faster to encode on CPU.
+- "precomputed": no model at all. Answer-text similarity is disabled, so
+  retrieval ranks patterns by the concept partition and follow-up type only.
+
+The onnx backends have not yet been measured against torch, so the values
+in BACKEND_TOLERANCE are targets, not established tolerances: 1e-4 for onnx
+(the same model, so only float rounding) and 5e-2 for onnx-int8
+(quantisation noise). Measure them on a host that can download the model:
+
+    python embeddings.py onnx onnx-int8
+
+This prints the largest cosine-similarity difference from torch over the
+pattern bank and the top-k neighbour agreement. Record the results here
+before dropping "experimental".
+"""
+import argparse
+import json
+import numpy as np
+from config import EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_ONNX_INT8_FILE
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8", "precomputed")
+
+# Target max absolute cosine-similarity difference from the torch backend (unmeasured for onnx; see above)
+BACKEND_TOLERANCE = {"torch": 0.0, "onnx": 1e-4, "onnx-int8": 5e-2}
+
+class TorchEmbedder:
+    """SentenceTransformer on PyTorch (imports torch/transformers, so only on first use)"""
+    can_encode = True
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts, normalize_embeddings=False):
+        return self.model.encode(texts, normalize_embeddings=normalize_embeddings)
+
+class OnnxEmbedder:
+    """
+    MiniLM on ONNX Runtime: tokenizer.json + an ONNX export from the model's
+    Hugging Face repo, with the same mean pooling as SentenceTransformer.
+    """
+    can_encode = True
+
+    def __init__(self, model_name, onnx_file="onnx/model.onnx", max_seq_length=256, batch_size=32):
+        import onnxruntime
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(repo_id, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+        self.session = onnxruntime.InferenceSession(
+            hf_hub_download(repo_id, onnx_file), providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.batch_size = batch_size
+
+    def encode(self, texts, normalize_embeddings=False):
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + self.batch_size])
+            input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+            attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+            token_embeddings = self.session.run(None, feeds)[0]  # (batch, seq, dim)
+            mask = attention_mask[..., None].astype(np.float32)
+            batches.append((token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+
+        if not batches:
+            return np.zeros((0, 0), dtype=np.float32)
+        embeddings = np.concatenate(batches).astype(np.float32)
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+class PrecomputedEmbedder:
+    """No model: callers must skip query encoding (answer-text similarity disabled)"""
+    can_encode = False
+
+    def encode(self, texts, normalize_embeddings=False):
+        raise RuntimeError("The 'precomputed' embedding backend has no model to encode text with")
+
+def load_embedder(model_name=EMBEDDING_MODEL_NAME, backend=EMBEDDING_BACKEND):
+    """Load the sentence embedder for a backend"""
+    if backend == "torch":
+        return TorchEmbedder(model_name)
+    if backend == "onnx":
+        return OnnxEmbedder(model_name)
+    if backend == "onnx-int8":
+        return OnnxEmbedder(model_name, onnx_file=EMBEDDING_ONNX_INT8_FILE)
+    if backend == "precomputed":
+        return PrecomputedEmbedder()
+    raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
+
+def check_backend_tolerance(backend, texts, model_name=EMBEDDING_MODEL_NAME, top_k=3):
+    """
+    Compare a backend against the torch reference on a set of probe texts.
+
+    Returns:
+        dict: max_cosine_diff over all text pairs, whether it is within the
+        backend's target tolerance, and top_k_agreement (mean share of each
+        text's top_k nearest other texts that both backends agree on)
+    """
+    reference = TorchEmbedder(model_name).encode(texts, normalize_embeddings=True)
+    candidate = load_embedder(model_name, backend).encode(texts, normalize_embeddings=True)
+    reference_sim, candidate_sim = reference @ reference.T, candidate @ candidate.T
+    max_diff = float(np.abs(reference_sim - candidate_sim).max())
+
+    # A text is always its own nearest neighbour, so leave the diagonal out
+    np.fill_diagonal(reference_sim, -np.inf)
+    np.fill_diagonal(candidate_sim, -np.inf)
+    k = min(top_k, len(texts) - 1)
+    reference_top = np.argsort(-reference_sim, axis=1)[:, :k]
+    candidate_top = np.argsort(-candidate_sim, axis=1)[:, :k]
+    agreement = np.mean([len(set(r) & set(c)) / k for r, c in zip(reference_top, candidate_top)]) if k else 1.0
+    return {
+        "max_cosine_diff": max_diff,
+        "within_tolerance": max_diff <= BACKEND_TOLERANCE[backend],
+        "top_k": k,
+        "top_k_agreement": float(agreement)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure embedding backends against the torch reference")
+    parser.add_argument("backends", nargs="+", choices=[b for b in BACKEND_TOLERANCE if b != "torch"])
+    parser.add_argument("--patterns", default="data/followup_patterns.json", help="Probe texts: the pattern bank")
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.patterns) as f:
+        patterns = json.load(f)
+    texts = [q for categories in patterns.values() for questions in categories.values() for q in questions]
+    results = {backend: check_backend_tolerance(backend, texts, top_k=args.top_k) for backend in args.backends}
+    print(json.dumps({"probe_texts": len(texts), "results": results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,16 @@
-from config import client, MODEL_NAME, MAX_TOKENS, TEMPERATURE
-from knowledge_base import get_feedback_context, get_concept_for_question
+from pydantic import BaseModel, Field
+from config import TEMPERATURE, ANSWER_TOKEN_BUDGET
+from llm import chat_completion, chat_completion_stream
+from knowledge_base import get_prompt_fragments
+from token_budget import truncate_to_budget
+from tracing import span
 
-def generate_feedback(question, user_answer, iteration=1):
-    """Generate structured feedback for a user's answer"""
+def _feedback_messages(question, user_answer, iteration):
+    """Build the chat messages for a feedback request"""
 
-    # Get concept knowledge 
-    concept = get_concept_for_question(question)
-    context_parts = []
-    if concept:
-        if 'key_points' in concept and concept['key_points']:
-            # Take top 3 key points
-            points = concept['key_points'][:3]
-            context_parts.append(f"Key points that should be covered: {', '.join(points)}")
-        
-        if 'interview_red_flags' in concept and concept['interview_red_flags']:
-            context_parts.append(f"Common mistakes to watch for: {', '.join(concept['interview_red_flags'])}")
-    
-    # Only add context if we have it
-    kb_context = '\n'.join(context_parts) if context_parts else ""
+    # Precompiled concept context (empty if no concept matched)
+    with span("concept_lookup"):
+        kb_context = get_prompt_fragments(question)['feedback']
     
     feedback_prompt = f"""
     You are a friendly data science interview coach giving conversational feedback.
@@ -37,34 +30,55 @@ def generate_feedback(question, user_answer, iteration=1):
     Keep it conversational, supportive, and concise (max 4-5 sentences). Don't give away the full answer - guide them to discover it.
     """
     
+    return [
+        {"role": "system", "content": "You are a supportive interview coach. Be conversational, brief, and encouraging."},
+        {"role": "user", "content": feedback_prompt}
+    ]
+
+def generate_feedback(question, user_answer, iteration=1):
+    """Generate structured feedback for a user's answer"""
+    user_answer = truncate_to_budget(user_answer, ANSWER_TOKEN_BUDGET)
     try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": "You are a supportive interview coach. Be conversational, brief, and encouraging."},
-                {"role": "user", "content": feedback_prompt}
-            ],
+        return chat_completion(
+            messages=_feedback_messages(question, user_answer, iteration),
             max_tokens=250,  
-            temperature=TEMPERATURE
+            temperature=TEMPERATURE,
+            call_site="feedback",
+            cache=True,
+            semantic_text=user_answer
         )
         
-        return response.choices[0].message.content
-        
     except Exception as e:
         return f"Error generating feedback: {str(e)}"
 
+def generate_feedback_stream(question, user_answer, iteration=1):
+    """Streaming variant of generate_feedback: yields text chunks as they arrive"""
+    user_answer = truncate_to_budget(user_answer, ANSWER_TOKEN_BUDGET)
+    try:
+        yield from chat_completion_stream(
+            messages=_feedback_messages(question, user_answer, iteration),
+            max_tokens=250,
+            temperature=TEMPERATURE,
+            call_site="feedback",
+            cache=True,
+            semantic_text=user_answer
+        )
+        
+    except Exception as e:
+        yield f"Error generating feedback: {str(e)}"
+
 def evaluate_answer_quality(question, user_answer):
     """Quick evaluation to determine if answer needs improvement"""
-    concept = get_concept_for_question(question)
-
-    key_points_text = "General data science knowledge expected"
-    red_flags_text = "Standard interview evaluation criteria"
+    quality_score = score_answer(question, user_answer)
+    return quality_score if quality_score is not None else 2  # Default to below average if error
 
-    if concept:
-        if 'key_points' in concept:
-            key_points_text = ', '.join(concept['key_points'])
-        if 'interview_red_flags' in concept:
-            red_flags_text = ', '.join(concept['interview_red_flags'])
+def score_answer(question, user_answer):
+    """1-5 quality score for an answer, or None if scoring failed"""
+    user_answer = truncate_to_budget(user_answer, ANSWER_TOKEN_BUDGET)
+    with span("concept_lookup"):
+        fragments = get_prompt_fragments(question)
+    key_points_text = fragments['scoring_key_points']
+    red_flags_text = fragments['scoring_red_flags']
 
     
     eval_prompt = f"""
@@ -93,14 +107,105 @@ def evaluate_answer_quality(question, user_answer):
     """
     
     try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
+        score_text = chat_completion(
             messages=[{"role": "user", "content": eval_prompt}],
             max_tokens=10,
-            temperature=0.1  # Lower temperature for more consistent scoring
+            temperature=0.1,  # Lower temperature for more consistent scoring
+            call_site="quality_score",
+            cache=True,
+            semantic_text=user_answer
         )
         
-        return int(response.choices[0].message.content.strip())
+        return int(score_text.strip())
+    
+    except Exception:
+        return None
+
+class FeedbackAssessment(BaseModel):
+    """Feedback text and 1-5 quality score from a single combined completion"""
+    feedback: str = Field(min_length=1)
+    score: int = Field(ge=1, le=5)
+
+# Strict JSON schema sent to the API; FeedbackAssessment re-validates the reply
+FEEDBACK_ASSESSMENT_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "feedback_assessment",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "feedback": {"type": "string"},
+                "score": {"type": "integer", "enum": [1, 2, 3, 4, 5]}
+            },
+            "required": ["feedback", "score"],
+            "additionalProperties": False
+        }
+    }
+}
+
+def generate_feedback_and_score(question, user_answer, iteration=1):
+    """
+    Generate feedback and the quality score in one structured completion.
+    
+    The prompt carries the question, answer and concept context once instead
+    of twice. The reply must match FEEDBACK_ASSESSMENT_FORMAT and validate as
+    FeedbackAssessment.
+    
+    Returns:
+        tuple: (feedback, quality_score), or None if the call failed or its
+        output did not validate - callers then use the two-call path
+        (generate_feedback + evaluate_answer_quality)
+    """
+    user_answer = truncate_to_budget(user_answer, ANSWER_TOKEN_BUDGET)
+    with span("concept_lookup"):
+        fragments = get_prompt_fragments(question)
+    
+    combined_prompt = f"""
+    You are a friendly data science interview coach. Give the student feedback AND a strict score.
+    
+    QUESTION: {question}
+    STUDENT ANSWER: {user_answer}
+    ATTEMPT: {iteration}
+    
+    EXPECTED KEY POINTS:
+    {fragments['scoring_key_points']}
+    
+    RED FLAGS TO PENALIZE:
+    {fragments['scoring_red_flags']}
+    
+    FEEDBACK (directly to the student, use "you", not "the candidate"):
+    1. POSITIVE: Start with something they got right or showed understanding of
+    2. KEY GAP: Identify the most important thing they missed (don't explain it fully)
+    3. NEXT STEP: Give ONE specific suggestion to improve their answer (avoid the red flags listed)
+    Keep it conversational, supportive, and concise (max 4-5 sentences). Don't give away the full answer.
+    
+    SCORE (1-5, be harsh but fair - most real interview answers are 2-3/5):
+    1 = Very poor (major gaps, oversimplified, or major red flags present)
+    2 = Poor (shows some awareness but significant issues)
+    3 = Average (covers basics but lacks depth/examples)
+    4 = Good (solid understanding with minor gaps)
+    5 = Excellent (comprehensive, accurate, well-explained)
+    
+    Return JSON with "feedback" (string) and "score" (integer 1-5).
+    """
+    
+    try:
+        reply = chat_completion(
+            messages=[
+                {"role": "system", "content": "You are a supportive interview coach and a strict, consistent grader."},
+                {"role": "user", "content": combined_prompt}
+            ],
+            max_tokens=300,
+            temperature=0.3,  # Between the feedback and scoring temperatures: consistent scores, natural feedback
+            call_site="feedback_and_score",
+            cache=True,
+            semantic_text=user_answer,
+            response_format=FEEDBACK_ASSESSMENT_FORMAT
+        )
+        assessment = FeedbackAssessment.model_validate_json(reply or "")
+        return assessment.feedback, assessment.score
     
-    except:
-        return 2  # Default to below average if error
\ No newline at end of file
+    except Exception:
+        # Provider error, or a reply that fails FeedbackAssessment validation
+        return None
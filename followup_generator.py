@@ -1,17 +1,41 @@
+import hashlib
 import json
+import os
 import random
-import openai
-from sentence_transformers import SentenceTransformer
+import threading
+import time
 import numpy as np
-from config import OPENAI_API_KEY, MODEL_NAME, MAX_TOKENS, TEMPERATURE
-from knowledge_base import get_concept_for_question
+from config import (
+    TEMPERATURE, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_CACHE_DIR,
+    INDEX_ARTIFACT_DIR, VECTOR_INDEX_BACKEND, RETRIEVAL_CANDIDATE_FACTOR,
+    ANSWER_TOKEN_BUDGET, FEEDBACK_TOKEN_BUDGET, PATTERN_CONTEXT_TOKEN_BUDGET
+)
+from knowledge_base import get_prompt_fragments, resolve_concept_key
+from embeddings import load_embedder
+from followup_policy import FALLBACK_PATH, LLM_PATH, PATTERN_PATH, get_followup_policy
+from index_artifact import load_artifact, pattern_columns
+from llm import chat_completion
+from token_budget import truncate_to_budget, warm_up_encoding
+from tracing import set_attributes, span
+from vector_index import PartitionedIndex
 
-openai.api_key = OPENAI_API_KEY
+def embedding_cache_path(patterns_file, model_name, cache_dir=EMBEDDING_CACHE_DIR):
+    """Cache file for pattern embeddings, keyed by patterns file content and model name"""
+    digest = hashlib.sha256()
+    with open(patterns_file, 'rb') as f:
+        digest.update(f.read())
+    digest.update(model_name.encode('utf-8'))
+    return os.path.join(cache_dir, f"pattern_embeddings_{digest.hexdigest()[:16]}.npy")
 
 class FollowupGenerator:
-    def __init__(self, patterns_file='data/followup_patterns.json'):
+    def __init__(self, patterns_file='data/followup_patterns.json', model_name=EMBEDDING_MODEL_NAME,
+                 index_backend=VECTOR_INDEX_BACKEND, embedding_backend=EMBEDDING_BACKEND):
+        self.patterns_file = patterns_file
+        self.model_name = model_name
+        self.embedding_backend = embedding_backend
+        self.index_backend = index_backend
         self.patterns = self.load_patterns(patterns_file)
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
+        self.embedder = load_embedder(model_name, embedding_backend)
         self.setup_embeddings()
     
     def load_patterns(self, filepath):
@@ -25,23 +49,89 @@ class FollowupGenerator:
     
     def setup_embeddings(self):
         """Create embeddings for all followup patterns for RAG retrieval"""
-        all_patterns = []
-        self.pattern_metadata = []
-        
-        for concept, categories in self.patterns.items():
-            for category, questions in categories.items():
-                for question in questions:
-                    all_patterns.append(question)
-                    self.pattern_metadata.append({
-                        'concept': concept,
-                        'category': category,
-                        'question': question
-                    })
+        # A prebuilt artifact (build_index.py) means this worker never encodes the pattern bank
+        artifact = None
+        if self.embedder.can_encode:
+            artifact = load_artifact(INDEX_ARTIFACT_DIR, self.patterns_file, self.model_name, self.embedding_backend)
+        if artifact is not None:
+            self.setup_metadata(artifact['columns'])
+            # float32 on disk, so the index reads the shared mapped pages without a copy
+            self.pattern_embeddings = artifact['embeddings']
+            self.setup_index()
+            return
+
+        self.setup_metadata()
+        all_patterns = self.pattern_questions
         
         if all_patterns:
-            self.pattern_embeddings = self.embedder.encode(all_patterns, normalize_embeddings= True) # normalise for cosine sim instead of plain dot product
+            if not self.embedder.can_encode:
+                # Similarity is disabled: one constant column keeps the index shape valid
+                self.pattern_embeddings = np.zeros((len(all_patterns), 1), dtype=np.float32)
+            else:
+                self.pattern_embeddings = self.load_cached_embeddings(len(all_patterns))
+            if self.pattern_embeddings is None:
+                self.pattern_embeddings = self.embedder.encode(all_patterns, normalize_embeddings= True) # normalise for cosine sim instead of plain dot product
+                self.save_cached_embeddings(self.pattern_embeddings)
+            self.setup_index()
         else:
             self.pattern_embeddings = np.array([])
+            self.index = None
+
+    def setup_metadata(self, columns=None):
+        """
+        Store pattern metadata as columns: integer-coded concept and category
+        ids plus a row range per concept (see index_artifact.pattern_columns).
+        """
+        if columns is None:
+            columns = pattern_columns(self.patterns)
+        self.pattern_questions = columns['questions']
+        self.concept_names = columns['concept_names']
+        self.category_names = columns['category_names']
+        self.concept_offsets = columns['concept_offsets']  # concept key -> (start, stop) row range
+        self.concept_ids = columns['concept_ids']
+        self.category_ids = columns['category_ids']
+        self.concept_codes = {name: i for i, name in enumerate(self.concept_names)}
+        self.category_codes = {name: i for i, name in enumerate(self.category_names)}
+
+    def pattern_record(self, i):
+        """Metadata dict for one pattern row"""
+        return {
+            'concept': self.concept_names[self.concept_ids[i]],
+            'category': self.category_names[self.category_ids[i]],
+            'question': self.pattern_questions[i]
+        }
+
+    def setup_index(self):
+        """Build the retrieval index with one sub-index per concept"""
+        partitions = {
+            concept: np.arange(start, stop) for concept, (start, stop) in self.concept_offsets.items()
+        }
+        self.index = PartitionedIndex(self.pattern_embeddings, partitions, backend=self.index_backend)
+
+    def load_cached_embeddings(self, expected_rows):
+        """Memory-map previously encoded pattern embeddings, or return None on a cache miss"""
+        try:
+            path = embedding_cache_path(self.patterns_file, f"{self.model_name}:{self.embedding_backend}")
+            embeddings = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+        # Content hash should guarantee this, but never trust a truncated or foreign file
+        if embeddings.ndim != 2 or embeddings.shape[0] != expected_rows:
+            return None
+        return embeddings
+
+    def save_cached_embeddings(self, embeddings):
+        """Persist pattern embeddings so warm restarts skip encoding"""
+        try:
+            path = embedding_cache_path(self.patterns_file, f"{self.model_name}:{self.embedding_backend}")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so concurrent workers never read a half-written file
+            tmp_path = f"{path[:-len('.npy')]}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, np.asarray(embeddings, dtype=np.float32))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: could not cache pattern embeddings: {e}")
     
     def determine_followup_type(self, quality_score, feedback):
         """Determine what type of follow-up question to ask"""
@@ -61,66 +151,83 @@ class FollowupGenerator:
     
     def retrieve_relevant_patterns(self, original_question, user_answer, followup_type, top_k=3):
         """Use RAG to retrieve most relevant follow-up patterns (cosine + small boosts)."""
-        if len(self.pattern_embeddings) == 0:
-            return []
+        return self.retrieve_relevant_patterns_batch(
+            [original_question], [user_answer], [followup_type], top_k=top_k
+        )[0]
 
-        # 1) Query embedding (unit-normalised) → cosine similarity in [-1, 1]
-        query_text = f"{original_question} {user_answer}"
-        query_embedding = self.embedder.encode([query_text], normalize_embeddings=True)  # shape (1, d)
-        sim = (query_embedding @ self.pattern_embeddings.T).ravel()  # cosine in [-1, 1]
+    def retrieve_relevant_patterns_batch(self, original_questions, user_answers, followup_types, top_k=3):
+        """
+        Retrieve follow-up patterns for many answers at once.
 
-        # 2) Concept/type features (vectorised)
-        concept = self.get_concept_from_question(original_question)
-        concept_match = np.array([m['concept'] == concept for m in self.pattern_metadata], dtype=np.float32)
-        type_match    = np.array([m['category'] == followup_type for m in self.pattern_metadata], dtype=np.float32)
+        All queries are encoded in one batched call and scored with one matrix
+        multiply per concept partition; top-k uses argpartition. The single-query
+        method goes through this same path, so rankings match it exactly (up to
+        float rounding differences between batched and single encoder runs).
 
-        # 3) Prefer same concept: if any exist (and concept not "general"), restrict ranking to them
-        if concept != "general" and concept_match.any():
-            mask = concept_match.astype(bool)
+        Returns:
+            list: One list of pattern dicts per query, best first
+        """
+        n_queries = len(original_questions)
+        if self.index is None or n_queries == 0 or top_k < 1:
+            return [[] for _ in range(n_queries)]
+
+        # 1) Query embeddings (unit-normalised) → cosine similarity in [-1, 1]
+        query_texts = [f"{question} {answer}" for question, answer in zip(original_questions, user_answers)]
+        if self.embedder.can_encode:
+            with span("embedding_encode", queries=n_queries):
+                query_embeddings = self.embedder.encode(query_texts, normalize_embeddings=True)  # shape (n, d)
         else:
-            mask = np.ones_like(sim, dtype=bool)
+            # No model: every similarity is 0, so only the concept/type boosts rank patterns
+            query_embeddings = np.zeros((n_queries, self.pattern_embeddings.shape[1]), dtype=np.float32)
 
-        # 4) Blend similarity (mapped to [0,1]) with small boosts so sim stays dominant
-        sim01 = (sim + 1.0) / 2.0  # [-1,1] → [0,1]
+        # 2) Prefer same concept: if any exist (and concept not "general"), restrict ranking to its sub-index
+        with span("concept_lookup"):
+            concepts = [self.get_concept_from_question(question) for question in original_questions]
+        concept_codes = np.array([self.concept_codes.get(concept, -1) for concept in concepts])
+        type_codes = np.array([self.category_codes.get(followup_type, -1) for followup_type in followup_types])
+        groups = {}
+        for i, concept in enumerate(concepts):
+            partition = concept if concept != "general" and concept in self.index.partitions else None
+            groups.setdefault(partition, []).append(i)
+
+        results = [[] for _ in range(n_queries)]
         w_sim, w_concept, w_type = 0.85, 0.10, 0.05
-        final = w_sim * sim01 + w_concept * concept_match + w_type * type_match
+        with span("retrieval", partitions=len(groups), top_k=top_k):
+            for partition, rows in groups.items():
+                rows = np.array(rows)
 
-        # 5) Rank within mask and return top_k
-        idx = np.where(mask)[0]
-        if idx.size == 0:
-            return []
-        top = idx[np.argsort(final[idx])[-min(top_k, idx.size):][::-1]]
-        return [self.pattern_metadata[i] for i in top]
+                # Exact backends score every row in the partition; approximate ones return a candidate pool to re-rank
+                n_rows = self.index.size(partition)
+                n_candidates = n_rows if self.index.is_exact(partition) else min(n_rows, top_k * RETRIEVAL_CANDIDATE_FACTOR)
+                sim, candidates = self.index.search(query_embeddings[rows], n_candidates, partition)
+                found = candidates >= 0
+                candidate_rows = np.where(found, candidates, 0)
+
+                # 3) Concept/type features for the candidates (vectorised over the id columns; -1 never matches)
+                concept_match = (self.concept_ids[candidate_rows] == concept_codes[rows, None]).astype(np.float32)
+                type_match    = (self.category_ids[candidate_rows] == type_codes[rows, None]).astype(np.float32)
+
+                # 4) Blend similarity (mapped to [0,1]) with small boosts so sim stays dominant
+                sim01 = (sim + 1.0) / 2.0  # [-1,1] → [0,1]
+                final = w_sim * sim01 + w_concept * concept_match + w_type * type_match
+                final[~found] = -np.inf
+
+                # 5) Rank candidates and return top_k
+                k = min(top_k, final.shape[1])
+                top = np.argpartition(-final, k - 1, axis=1)[:, :k]
+                order = np.argsort(-np.take_along_axis(final, top, axis=1), axis=1, kind='stable')
+                top = np.take_along_axis(top, order, axis=1)
+                for row, row_candidates, row_found, row_top in zip(rows, candidates, found, top):
+                    results[row] = [self.pattern_record(row_candidates[j]) for j in row_top if row_found[j]]
+
+        return results
 
-    
     def get_concept_from_question(self, question_text):
         """Extract concept key from question text"""
-        question_lower = question_text.lower()
-        
-        concept_mapping = {
-            "type i and type ii errors": "type_i_ii_errors",
-            "p-value": "p_value", 
-            "central limit theorem": "central_limit_theorem",
-            "correlation and causation": "correlation_vs_causation",
-            "bias-variance tradeoff": "bias_variance_tradeoff",
-            "class imbalance": "class_imbalance",
-            "bagging and boosting": "bagging_vs_boosting",
-            "linear regression": "linear_regression_assumptions",
-            "a/b test": "ab_test_design",
-            "missing": "missing_data_handling"
-        }
-        
-        for keyword, concept in concept_mapping.items():
-            if keyword in question_lower:
-                return concept
-        
-        return "general"
+        return resolve_concept_key(question_text)
     
-    def generate_followup_question(self, original_question, user_answer, feedback, quality_score):
-        """Generate contextual follow-up question using RAG and LLM"""
-        
-        # Determine type of follow-up needed
-        followup_type = self.determine_followup_type(quality_score, feedback)
+    def build_followup_messages(self, original_question, user_answer, followup_type, quality_score=None, feedback=None):
+        """Build the follow-up prompt; without a score and feedback it is a speculative draft prompt"""
         
         # Retrieve relevant patterns using RAG
         relevant_patterns = self.retrieve_relevant_patterns(
@@ -134,21 +241,26 @@ class FollowupGenerator:
                 pattern_context += f"- {pattern['question']} (Category: {pattern['category']})\n"
         else:
             pattern_context = "No specific patterns found."
+        pattern_context = truncate_to_budget(pattern_context, PATTERN_CONTEXT_TOKEN_BUDGET)
         
         # Get concept knowledge for additional context
-        concept_knowledge = get_concept_for_question(original_question)
-        concept_context = ""
-        if concept_knowledge:
-            concept_context = f"Key concept areas: {', '.join(concept_knowledge.get('key_points', []))}"
+        concept_context = get_prompt_fragments(original_question)['followup']
+        
+        # Keep the prompt within budget however long the answer and feedback are
+        prompt_answer = truncate_to_budget(user_answer, ANSWER_TOKEN_BUDGET)
+        assessment = ""
+        if quality_score is not None:
+            prompt_feedback = truncate_to_budget(feedback, FEEDBACK_TOKEN_BUDGET)
+            assessment = f"""
+        ANSWER QUALITY: {quality_score}/5
+        FEEDBACK GIVEN: {prompt_feedback}"""
         
         # Generate follow-up using LLM
         followup_prompt = f"""
         You are conducting a technical interview. Based on the candidate's answer, generate ONE natural follow-up question.
         
         ORIGINAL QUESTION: {original_question}
-        CANDIDATE'S ANSWER: {user_answer}
-        ANSWER QUALITY: {quality_score}/5
-        FEEDBACK GIVEN: {feedback}
+        CANDIDATE'S ANSWER: {prompt_answer}{assessment}
         FOLLOWUP TYPE NEEDED: {followup_type}
         
         {pattern_context}
@@ -164,26 +276,99 @@ class FollowupGenerator:
         Return only the question, no extra text.
         """
         
+        return [
+            {"role": "system", "content": "You are an expert technical interviewer. Generate natural, probing follow-up questions."},
+            {"role": "user", "content": followup_prompt}
+        ]
+    
+    def complete_followup(self, messages, deadline=None):
+        """Send a follow-up prompt to the LLM and return the question text (by deadline, a time.monotonic())"""
+        policy = get_followup_policy()
+        started = time.monotonic()
         try:
-            response = openai.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": "You are an expert technical interviewer. Generate natural, probing follow-up questions."},
-                    {"role": "user", "content": followup_prompt}
-                ],
+            followup_text = chat_completion(
+                messages=messages,
                 max_tokens=150,
-                temperature=TEMPERATURE
+                temperature=TEMPERATURE,
+                call_site="followup",
+                deadline=max(deadline - started, 0.0) if deadline is not None else None
             )
-            
-            return response.choices[0].message.content.strip()
+        except Exception:
+            policy.record_call(time.monotonic() - started, ok=False)
+            raise
+        policy.record_call(time.monotonic() - started, ok=True)
+        return followup_text.strip()
+    
+    def generate_followup_question(self, original_question, user_answer, feedback, quality_score, deadline=None):
+        """
+        Generate contextual follow-up question using RAG and LLM.
+        
+        When the follow-up policy reports the LLM path as degraded (latency SLO,
+        error rate, token budget or the deadline), the best-ranked retrieved
+        pattern is returned without calling the LLM.
+        
+        Args:
+            deadline (float): Optional time.monotonic() by which the question is needed
+        """
+        
+        # Determine type of follow-up needed
+        followup_type = self.determine_followup_type(quality_score, feedback)
+        
+        policy = get_followup_policy()
+        path, reason = policy.choose(deadline)
+        set_attributes(followup_type=followup_type, followup_path=path if reason is None else f"{path}:{reason}")
+        if path == PATTERN_PATH:
+            policy.record_path(PATTERN_PATH, reason)
+            return self.best_pattern_question(original_question, user_answer, followup_type)
+        
+        try:
+            followup_question = self.complete_followup(self.build_followup_messages(
+                original_question, user_answer, followup_type, quality_score, feedback
+            ), deadline)
+            policy.record_path(LLM_PATH)
+            return followup_question
             
         except Exception as e:
             # Fallback to pattern-based selection
-            concept = self.get_concept_from_question(original_question)
-            if concept in self.patterns and followup_type in self.patterns[concept]:
-                return random.choice(self.patterns[concept][followup_type])
-            else:
-                return "Can you elaborate more on that concept?"
+            policy.record_path(FALLBACK_PATH)
+            set_attributes(followup_path=FALLBACK_PATH)
+            return self.random_pattern_question(original_question, followup_type)
+    
+    def best_pattern_question(self, original_question, user_answer, followup_type):
+        """Top retrieved pattern for the answer, without an LLM call"""
+        relevant_patterns = self.retrieve_relevant_patterns(original_question, user_answer, followup_type, top_k=1)
+        if relevant_patterns:
+            return relevant_patterns[0]['question']
+        return self.random_pattern_question(original_question, followup_type)
+    
+    def random_pattern_question(self, original_question, followup_type):
+        """Random stored pattern for the question's concept and follow-up type"""
+        concept = self.get_concept_from_question(original_question)
+        if concept in self.patterns and followup_type in self.patterns[concept]:
+            return random.choice(self.patterns[concept][followup_type])
+        else:
+            return "Can you elaborate more on that concept?"
+    
+    def draft_followup_question(self, original_question, user_answer, followup_type, deadline=None):
+        """
+        Speculatively draft a follow-up before the score and feedback exist.
+        
+        Args:
+            deadline (float): Optional time.monotonic() by which the follow-up is needed
+        
+        Returns:
+            str: The drafted question, or None on error (the caller then
+            generates the follow-up normally)
+        """
+        # No point spending a call the policy would not make for the real follow-up
+        if get_followup_policy().choose(deadline)[0] == PATTERN_PATH:
+            return None
+        try:
+            return self.complete_followup(
+                self.build_followup_messages(original_question, user_answer, followup_type), deadline
+            )
+        except Exception:
+            return None
     
     def should_ask_followup(self, quality_score, feedback, is_revision=False):
         """Determine if a follow-up question is warranted"""
@@ -201,12 +386,47 @@ class FollowupGenerator:
             
         return False
 
+# One shared generator per process: the embedder and pattern embeddings are
+# read-only after construction, so every session can reuse them safely
+_generator = None
+_generator_lock = threading.Lock()
+_warmup_thread = None
+
+def get_followup_generator():
+    """Return the process-wide FollowupGenerator, building it on first use"""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = FollowupGenerator()
+    return _generator
+
+def _warm_up():
+    get_followup_generator()
+    # The clarification index shares the embedder; without an artifact it encodes every KB chunk
+    from knowledge_retrieval import get_knowledge_retriever
+    get_knowledge_retriever()
+
+def warm_up_in_background():
+    """
+    Build the shared generator and knowledge retriever on a daemon thread so
+    the first submit or clarification doesn't pay for them, and start loading
+    the tokenizer.
+    """
+    global _warmup_thread
+    warm_up_encoding()
+    with _generator_lock:
+        if _generator is not None or _warmup_thread is not None:
+            return
+        _warmup_thread = threading.Thread(target=_warm_up, name="embedder-warmup", daemon=True)
+    _warmup_thread.start()
+
 # Convenience function for easy import
-def generate_followup_question(original_question, user_answer, feedback, quality_score, is_revision=False):
+def generate_followup_question(original_question, user_answer, feedback, quality_score, is_revision=False, deadline=None):
     """Convenience function to generate follow-up question"""
-    generator = FollowupGenerator()
+    generator = get_followup_generator()
     
     if not generator.should_ask_followup(quality_score, feedback, is_revision):
         return None
         
-    return generator.generate_followup_question(original_question, user_answer, feedback, quality_score)
\ No newline at end of file
+    return generator.generate_followup_question(original_question, user_answer, feedback, quality_score, deadline)
\ No newline at end of file
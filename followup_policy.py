@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import deque
+from config import (
+    FOLLOWUP_POLICY_ENABLED, FOLLOWUP_LATENCY_SLO_SECONDS, FOLLOWUP_ERROR_RATE_THRESHOLD,
+    FOLLOWUP_POLICY_WINDOW_SECONDS, FOLLOWUP_POLICY_MIN_SAMPLES, PROCESS_TOKEN_BUDGET
+)
+from token_budget import recent_tokens_used
+
+# Paths a follow-up can take, reported by policy_report()
+LLM_PATH = "llm"
+PATTERN_PATH = "pattern"
+FALLBACK_PATH = "fallback"  # the LLM call was attempted and failed
+
+# What became of a speculative follow-up draft (SPECULATIVE_FOLLOWUP), reported by policy_report()
+DRAFT_USED = "used"
+DRAFT_DISCARDED = "discarded"  # started or finished, then not used: a paid call thrown away
+DRAFT_CANCELLED = "cancelled"  # dropped before it started, so it cost nothing
+DRAFT_EMPTY = "empty"  # the draft skipped the LLM (policy) or failed, so the follow-up was generated normally
+
+class FollowupPolicy:
+    """
+    Decides whether a follow-up goes to the LLM or straight to the best retrieved pattern.
+
+    Recent follow-up LLM calls are kept in a time window (latency, success).
+    The pattern fast path is taken when, over that window, the p95 latency
+    breaches the SLO or the error rate exceeds the threshold, when the process
+    has spent its token budget (PROCESS_TOKEN_BUDGET over a rolling window of
+    PROCESS_TOKEN_BUDGET_WINDOW_SECONDS), or when the request's deadline leaves
+    less time than a typical LLM call. Samples and spent tokens both age out of
+    their windows, so once they drain the LLM path is tried again.
+    """
+
+    def __init__(self, latency_slo=FOLLOWUP_LATENCY_SLO_SECONDS, error_rate_threshold=FOLLOWUP_ERROR_RATE_THRESHOLD,
+                 window_seconds=FOLLOWUP_POLICY_WINDOW_SECONDS, min_samples=FOLLOWUP_POLICY_MIN_SAMPLES,
+                 token_budget=PROCESS_TOKEN_BUDGET, enabled=FOLLOWUP_POLICY_ENABLED):
+        self.latency_slo = latency_slo
+        self.error_rate_threshold = error_rate_threshold
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.token_budget = token_budget
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls = deque()  # (finished_at, latency_seconds, ok)
+        self._counts = {}
+        self._drafts = {}
+
+    def _prune(self, now):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _window_stats(self):
+        """(p95 latency of successful calls or None, error rate or None) over the current window"""
+        with self._lock:
+            self._prune(time.monotonic())
+            calls = list(self._calls)
+        if len(calls) < self.min_samples:
+            return None, None
+        latencies = sorted(latency for _, latency, ok in calls if ok)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else None
+        error_rate = sum(1 for _, _, ok in calls if not ok) / len(calls)
+        return p95, error_rate
+
+    def choose(self, deadline=None):
+        """
+        Pick the path for one follow-up.
+
+        Args:
+            deadline (float): Optional time.monotonic() by which the follow-up is needed
+
+        Returns:
+            tuple: (path, reason) - (LLM_PATH, None) or (PATTERN_PATH, reason) where
+            reason is "deadline", "token_budget", "error_rate" or "latency_slo"
+        """
+        if not self.enabled:
+            return LLM_PATH, None
+
+        p95, error_rate = self._window_stats()
+        if deadline is not None:
+            expected = p95 if p95 is not None else self.latency_slo
+            if deadline - time.monotonic() < expected:
+                return PATTERN_PATH, "deadline"
+        if self.token_budget and recent_tokens_used() >= self.token_budget:
+            return PATTERN_PATH, "token_budget"
+        if error_rate is not None and error_rate > self.error_rate_threshold:
+            return PATTERN_PATH, "error_rate"
+        if p95 is not None and p95 > self.latency_slo:
+            return PATTERN_PATH, "latency_slo"
+        return LLM_PATH, None
+
+    def record_call(self, latency, ok):
+        """Record the outcome of one follow-up LLM call"""
+        with self._lock:
+            now = time.monotonic()
+            self._calls.append((now, latency, ok))
+            self._prune(now)
+
+    def record_path(self, path, reason=None):
+        """Count a follow-up served by path (and, for the fast path, why)"""
+        key = f"{path}:{reason}" if reason else path
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def record_draft(self, outcome):
+        """Count what became of one speculative draft (DRAFT_USED, DRAFT_DISCARDED, ...)"""
+        with self._lock:
+            self._drafts[outcome] = self._drafts.get(outcome, 0) + 1
+
+    def report(self):
+        """Counts per path taken and per draft outcome, plus the current window statistics"""
+        p95, error_rate = self._window_stats()
+        with self._lock:
+            counts = dict(self._counts)
+            drafts = dict(self._drafts)
+            window_calls = len(self._calls)
+        return {
+            'paths': counts,
+            'drafts': drafts,
+            'window_calls': window_calls,
+            'window_p95_latency': p95,
+            'window_error_rate': error_rate
+        }
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._counts.clear()
+            self._drafts.clear()
+
+_policy = FollowupPolicy()
+
+def get_followup_policy():
+    """The process-wide follow-up policy"""
+    return _policy
+
+def policy_report():
+    """How often each follow-up path was taken, and each draft outcome seen, in this process"""
+    return _policy.report()
@@ -0,0 +1,256 @@
+"""
+Bulk offline grading of exported answers with the app's feedback and scoring.
+
+Streams rows from JSONL, CSV or Parquet and grades each one with the same
+logic as the app (score_answer + generate_feedback, or the
+combined call when COMBINED_FEEDBACK_SCORING is on). It keeps at most
+2 x concurrency rows in flight, so memory stays flat however large the
+input. Results are appended to a JSONL file as they complete.
+
+The checkpoint beside the output records a watermark: every row below it
+is in the output. A resumed run skips those rows, plus any rows above the
+watermark already in the output, and carries on. The output itself is the
+record of the work, so a crash loses at most the rows in flight.
+
+Rows whose scoring or feedback failed are written with an "error" and count
+as done: a resumed run does not retry them. Re-grade those rows by filtering
+them out of the output into a new input file.
+
+Usage:
+    python grade.py answers.jsonl graded.jsonl [--concurrency 8] [--rows-per-minute 600]
+                    [--question-field question] [--answer-field answer] [--id-field id] [--no-resume]
+"""
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from config import BULK_CALL_PRIORITY
+from pipeline import grade_answer
+from rate_limiter import priority
+from token_budget import usage_report
+
+CHECKPOINT_EVERY = 100  # completed rows between checkpoint writes
+PROGRESS_EVERY_SECONDS = 10.0
+
+def iter_rows(path, input_format=None):
+    """Yield input rows as dicts, reading JSONL/CSV line by line and Parquet batch by batch"""
+    input_format = input_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if input_format in ("jsonl", "ndjson"):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif input_format == "csv":
+        with open(path, newline="") as f:
+            yield from csv.DictReader(f)
+    elif input_format == "parquet":
+        # Optional dependency, only needed for Parquet input
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=1024):
+            yield from batch.to_pylist()
+    else:
+        raise ValueError(f"Unsupported input format '{input_format}' (use jsonl, csv or parquet)")
+
+class RowPacer:
+    """Spaces row starts evenly to stay under a rows-per-minute cap (None = no cap)"""
+
+    def __init__(self, rows_per_minute=None):
+        self.interval = 60.0 / rows_per_minute if rows_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+class Checkpoint:
+    """Low watermark of completed rows, written atomically next to the output"""
+
+    def __init__(self, path, input_path):
+        self.path = path
+        self.input_path = input_path
+        self.watermark = 0
+        self._done_above = set()  # completed rows >= watermark; bounded by the rows in flight
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                state = json.load(f)
+            if state.get("input") != os.path.abspath(self.input_path):
+                raise ValueError(f"Checkpoint {self.path} belongs to {state.get('input')}, not {self.input_path}")
+            self.watermark = state["watermark"]
+
+    def mark_done(self, row):
+        self._done_above.add(row)
+        while self.watermark in self._done_above:
+            self._done_above.remove(self.watermark)
+            self.watermark += 1
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"input": os.path.abspath(self.input_path), "watermark": self.watermark}, f)
+        os.replace(tmp_path, self.path)
+
+def _recover_output(output_path, watermark):
+    """
+    Drop a torn final line from a crashed run and return the rows at or above
+    the watermark that the output already holds.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        # Walk back to the last newline; anything after it is a partial write
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            f.seek(position - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position < size:
+            f.truncate(position)
+
+    done = set()
+    with open(output_path) as f:
+        for line in f:
+            row = json.loads(line)["row"]
+            if row >= watermark:
+                done.add(row)
+    return done
+
+def _grade_row(row_index, record, question_field, answer_field, id_field, pacer):
+    pacer.wait()
+    question, answer = record.get(question_field), record.get(answer_field)
+    result = {"row": row_index, "id": record.get(id_field)}
+    if not question or not answer:
+        return {**result, "error": f"missing {question_field!r} or {answer_field!r}"}
+    started = time.perf_counter()
+    # Bulk rows queue behind interactive sessions for the shared LLM budget
+    with priority(BULK_CALL_PRIORITY):
+        feedback, quality_score = grade_answer(question, answer)
+    errors = []
+    if quality_score is None:
+        errors.append("scoring failed")
+    if feedback.startswith("Error generating feedback"):
+        errors.append("feedback generation failed")
+    return {
+        **result,
+        "quality_score": quality_score,
+        "feedback": feedback,
+        "error": "; ".join(errors) or None,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+def grade_file(input_path, output_path, concurrency=8, rows_per_minute=None, resume=True, input_format=None,
+               question_field="question", answer_field="answer", id_field="id", progress=print):
+    """
+    Grade every row of input_path into output_path (JSONL, one result per row).
+
+    Args:
+        input_path (str): JSONL, CSV or Parquet file of answers
+        output_path (str): JSONL results file, appended to as rows complete
+        concurrency (int): Rows graded at once
+        rows_per_minute (float): Optional cap on row starts per minute
+        resume (bool): Continue from the checkpoint of an earlier run
+        progress (callable): Receives progress lines (None to stay quiet)
+
+    Returns:
+        dict: rows graded, rows skipped (already done), errors, seconds and rows/s
+    """
+    checkpoint = Checkpoint(output_path + ".checkpoint", input_path)
+    if resume:
+        checkpoint.load()
+        already_done = _recover_output(output_path, checkpoint.watermark)
+    else:
+        already_done = set()
+        for path in (output_path, checkpoint.path):
+            if os.path.exists(path):
+                os.remove(path)
+    for row in already_done:
+        checkpoint.mark_done(row)
+
+    pacer = RowPacer(rows_per_minute)
+    graded = skipped = errors = 0
+    started = last_report = time.perf_counter()
+    in_flight = set()
+
+    def collect(futures):
+        nonlocal graded, errors
+        for future in futures:
+            result = future.result()
+            out.write(json.dumps(result) + "\n")
+            checkpoint.mark_done(result["row"])
+            graded += 1
+            errors += bool(result["error"])
+            if graded % CHECKPOINT_EVERY == 0:
+                # Results must be on disk before the watermark that vouches for them
+                out.flush()
+                os.fsync(out.fileno())
+                checkpoint.save()
+
+    with open(output_path, "a") as out, ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="grade") as pool:
+        for row_index, record in enumerate(iter_rows(input_path, input_format)):
+            if row_index < checkpoint.watermark or row_index in already_done:
+                skipped += 1
+                continue
+            if len(in_flight) >= 2 * concurrency:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+            in_flight.add(pool.submit(_grade_row, row_index, record, question_field, answer_field, id_field, pacer))
+
+            now = time.perf_counter()
+            if progress and now - last_report >= PROGRESS_EVERY_SECONDS:
+                last_report = now
+                progress(f"{graded} rows graded ({graded / (now - started):.1f} rows/s), {errors} errors")
+        collect(in_flight)
+        out.flush()
+        os.fsync(out.fileno())
+        checkpoint.save()
+
+    seconds = time.perf_counter() - started
+    summary = {
+        "graded": graded,
+        "skipped": skipped,
+        "errors": errors,
+        "seconds": round(seconds, 2),
+        "rows_per_second": round(graded / seconds, 2) if seconds else 0.0
+    }
+    if progress:
+        progress(f"Done: {graded} graded, {skipped} already done, {errors} errors in {summary['seconds']}s "
+                 f"({summary['rows_per_second']} rows/s)")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade a file of interview answers offline")
+    parser.add_argument("input", help="JSONL, CSV or Parquet file of answers")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--format", dest="input_format", help="Input format if the extension doesn't say")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rows-per-minute", type=float, help="Cap on rows started per minute")
+    parser.add_argument("--question-field", default="question")
+    parser.add_argument("--answer-field", default="answer")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--no-resume", action="store_true", help="Start over, discarding earlier output")
+    args = parser.parse_args()
+
+    summary = grade_file(args.input, args.output, args.concurrency, args.rows_per_minute, not args.no_resume,
+                         args.input_format, args.question_field, args.answer_field, args.id_field)
+    summary["token_usage"] = usage_report()
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Prebuilt retrieval index artifact.
+
+An artifact directory holds everything FollowupGenerator would otherwise
+compute at startup:
+
+    manifest.json            format version, model/backend, input and file hashes
+    pattern_embeddings.npy   unit-normalised pattern embeddings, float32
+    concept_ids.npy          int16 concept id per pattern row
+    category_ids.npy         int16 category id per pattern row
+    pattern_questions.json   pattern text per row
+    concept_tables.json      concept/category names and per-concept row ranges
+    kb_chunk_embeddings.npy  knowledge-base chunk embeddings, float32
+    kb_chunks.json           knowledge-base chunks (concept, kind, text)
+
+The artifact path is a symlink to a versioned directory beside it
+(index.v<timestamp>-<pid>). A rebuild writes a new version and swaps the
+symlink in one rename, so a starting worker always finds a complete artifact.
+The previous version is kept so workers already reading it are unaffected.
+
+Build one with build_index.py; workers memory-map it at startup. Embeddings
+are stored as float32, the dtype the indexes score in, so the mapped pages are
+used as-is instead of being copied into every worker.
+"""
+import hashlib
+import json
+import os
+import glob
+import shutil
+import time
+import numpy as np
+from knowledge_base import INTERVIEW_CONCEPTS, concept_chunks
+
+ARTIFACT_FORMAT_VERSION = 3
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def concepts_sha256():
+    """Hash of the INTERVIEW_CONCEPTS knowledge base"""
+    return hashlib.sha256(json.dumps(INTERVIEW_CONCEPTS, sort_keys=True).encode('utf-8')).hexdigest()
+
+def pattern_columns(patterns, concept_names=()):
+    """
+    Columnar metadata for a patterns dict: integer-coded concept and category
+    ids plus a row range per concept (patterns are laid out concept by concept).
+    Concept ids follow concept_names first, then any new concepts in pattern order.
+    """
+    questions = []
+    concept_codes = {name: i for i, name in enumerate(concept_names)}
+    category_codes = {}
+    concept_offsets = {}
+    concept_ids = []
+    category_ids = []
+
+    for concept, categories in patterns.items():
+        concept_id = concept_codes.setdefault(concept, len(concept_codes))
+        start = len(questions)
+        for category, category_questions in categories.items():
+            category_id = category_codes.setdefault(category, len(category_codes))
+            for question in category_questions:
+                questions.append(question)
+                concept_ids.append(concept_id)
+                category_ids.append(category_id)
+        concept_offsets[concept] = (start, len(questions))
+
+    return {
+        'questions': questions,
+        'concept_names': list(concept_codes),
+        'category_names': list(category_codes),
+        'concept_offsets': concept_offsets,
+        'concept_ids': np.array(concept_ids, dtype=np.int16),
+        'category_ids': np.array(category_ids, dtype=np.int16)
+    }
+
+def build_artifact(out_dir, patterns_file, embedder, model_name, embedding_backend):
+    """Encode the pattern bank and write a complete artifact to out_dir; returns the manifest"""
+    with open(patterns_file, 'r') as f:
+        patterns = json.load(f)
+
+    # Knowledge-base concepts get the low ids so they are stable across pattern edits
+    columns = pattern_columns(patterns, concept_names=list(INTERVIEW_CONCEPTS))
+    embeddings = embedder.encode(columns['questions'], normalize_embeddings=True)
+    chunks = concept_chunks()
+    chunk_embeddings = embedder.encode([chunk['text'] for chunk in chunks], normalize_embeddings=True)
+
+    # Build a new version beside the target; it becomes visible only when the symlink is swapped
+    out_dir = out_dir.rstrip(os.sep)
+    version_dir = f"{out_dir}.v{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+    os.makedirs(version_dir)
+    np.save(os.path.join(version_dir, 'pattern_embeddings.npy'), np.asarray(embeddings, dtype=np.float32))
+    np.save(os.path.join(version_dir, 'concept_ids.npy'), columns['concept_ids'])
+    np.save(os.path.join(version_dir, 'category_ids.npy'), columns['category_ids'])
+    np.save(os.path.join(version_dir, 'kb_chunk_embeddings.npy'), np.asarray(chunk_embeddings, dtype=np.float32))
+    with open(os.path.join(version_dir, 'pattern_questions.json'), 'w') as f:
+        json.dump(columns['questions'], f)
+    with open(os.path.join(version_dir, 'kb_chunks.json'), 'w') as f:
+        json.dump(chunks, f)
+    with open(os.path.join(version_dir, 'concept_tables.json'), 'w') as f:
+        json.dump({
+            'concept_names': columns['concept_names'],
+            'category_names': columns['category_names'],
+            'concept_offsets': columns['concept_offsets']
+        }, f, indent=2)
+
+    files = sorted(os.listdir(version_dir))
+    manifest = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'model_name': model_name,
+        'embedding_backend': embedding_backend,
+        'embedding_dim': int(embeddings.shape[1]),
+        'n_patterns': len(columns['questions']),
+        'inputs': {
+            'followup_patterns': file_sha256(patterns_file),
+            'interview_concepts': concepts_sha256()
+        },
+        'files': {name: file_sha256(os.path.join(version_dir, name)) for name in files}
+    }
+    with open(os.path.join(version_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    _swap_in(out_dir, version_dir)
+    return manifest
+
+def _swap_in(out_dir, version_dir, keep=2):
+    """Point the out_dir symlink at version_dir atomically, then drop all but the newest `keep` versions"""
+    link_tmp = f"{out_dir}.link-{os.getpid()}"
+    os.symlink(os.path.basename(version_dir), link_tmp)
+    if os.path.isdir(out_dir) and not os.path.islink(out_dir):
+        # An artifact from before versioned directories: move it aside once (a plain directory can't be swapped atomically)
+        os.replace(out_dir, f"{out_dir}.v0-legacy")
+    os.replace(link_tmp, out_dir)
+
+    current = os.path.basename(version_dir)
+    versions = sorted(glob.glob(f"{glob.escape(out_dir)}.v*"), key=os.path.getmtime, reverse=True)
+    for path in [v for v in versions if os.path.basename(v) != current][keep - 1:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+def verify_artifact(artifact_dir):
+    """Return the names of artifact files whose hash no longer matches the manifest"""
+    with open(os.path.join(artifact_dir, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    return [
+        name for name, digest in manifest['files'].items()
+        if file_sha256(os.path.join(artifact_dir, name)) != digest
+    ]
+
+def _read_manifest(artifact_dir, model_name, embedding_backend):
+    """The artifact's manifest, or None if missing or built for another format/model/backend"""
+    try:
+        with open(os.path.join(artifact_dir, 'manifest.json'), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (manifest.get('format_version') != ARTIFACT_FORMAT_VERSION
+            or manifest.get('model_name') != model_name
+            or manifest.get('embedding_backend') != embedding_backend):
+        print(f"Warning: index artifact in {artifact_dir} was built for another format, model or backend; ignoring it")
+        return None
+    return manifest
+
+def load_artifact(artifact_dir, patterns_file, model_name, embedding_backend):
+    """
+    Memory-map a prebuilt artifact.
+
+    Returns None (so the caller computes everything itself) when there is no
+    artifact, or it was built from a different patterns file, model or backend.
+    File hashes are not re-checked here to keep startup cheap; run
+    `build_index.py --verify` at deploy time for that.
+
+    Returns:
+        dict: 'columns' (as pattern_columns) and 'embeddings' (float32, memory-mapped)
+    """
+    # Resolve the symlink once so every file comes from the same version, even mid-swap
+    artifact_dir = os.path.realpath(artifact_dir)
+    manifest = _read_manifest(artifact_dir, model_name, embedding_backend)
+    if manifest is None:
+        return None
+    if manifest['inputs']['followup_patterns'] != file_sha256(patterns_file):
+        print(f"Warning: index artifact in {artifact_dir} was built from another patterns file; ignoring it")
+        return None
+
+    with open(os.path.join(artifact_dir, 'pattern_questions.json'), 'r') as f:
+        questions = json.load(f)
+    with open(os.path.join(artifact_dir, 'concept_tables.json'), 'r') as f:
+        tables = json.load(f)
+
+    columns = {
+        'questions': questions,
+        'concept_names': tables['concept_names'],
+        'category_names': tables['category_names'],
+        'concept_offsets': {concept: tuple(rows) for concept, rows in tables['concept_offsets'].items()},
+        'concept_ids': np.load(os.path.join(artifact_dir, 'concept_ids.npy'), mmap_mode='r'),
+        'category_ids': np.load(os.path.join(artifact_dir, 'category_ids.npy'), mmap_mode='r')
+    }
+    embeddings = np.load(os.path.join(artifact_dir, 'pattern_embeddings.npy'), mmap_mode='r')
+    if embeddings.shape[0] != len(questions):
+        return None
+    return {'columns': columns, 'embeddings': embeddings}
+
+def load_kb_artifact(artifact_dir, model_name, embedding_backend):
+    """
+    Memory-map the knowledge-base chunk index from a prebuilt artifact.
+
+    Returns:
+        dict: 'chunks' and 'embeddings' (float32, memory-mapped), or None when
+        there is no artifact or INTERVIEW_CONCEPTS has changed since the build
+    """
+    artifact_dir = os.path.realpath(artifact_dir)
+    manifest = _read_manifest(artifact_dir, model_name, embedding_backend)
+    if manifest is None or manifest['inputs']['interview_concepts'] != concepts_sha256():
+        return None
+
+    with open(os.path.join(artifact_dir, 'kb_chunks.json'), 'r') as f:
+        chunks = json.load(f)
+    embeddings = np.load(os.path.join(artifact_dir, 'kb_chunk_embeddings.npy'), mmap_mode='r')
+    if embeddings.shape[0] != len(chunks):
+        return None
+    return {'chunks': chunks, 'embeddings': embeddings}
@@ -1,3 +1,6 @@
+import re
+from functools import lru_cache
+
 INTERVIEW_CONCEPTS = {
     "type_i_ii_errors": {
         "definition": "Type I: False positive (rejecting true null hypothesis). Type II: False negative (failing to reject false null hypothesis)",
@@ -275,70 +278,175 @@ INTERVIEW_CONCEPTS = {
     }
 }
 
+# Question keyword -> concept key, in priority order (an earlier keyword wins)
+CONCEPT_KEYWORDS = {
+    "type i and type ii errors": "type_i_ii_errors",
+    "p-value": "p_value", 
+    "central limit theorem": "central_limit_theorem",
+    "correlation and causation": "correlation_vs_causation",
+    "bias-variance tradeoff": "bias_variance_tradeoff",
+    "class imbalance": "class_imbalance",
+    "bagging and boosting": "bagging_vs_boosting",
+    "linear regression": "linear_regression_assumptions",
+    "a/b test": "ab_test_design",
+    "missing": "missing_data_handling"
+}
+
+# Single compiled pass over the question: the lookahead reports the highest-priority
+# keyword starting at every position, so overlapping keywords are never hidden
+_KEYWORD_PATTERN = re.compile("(?=(" + "|".join(re.escape(keyword) for keyword in CONCEPT_KEYWORDS) + "))")
+_KEYWORD_PRIORITY = {keyword: i for i, keyword in enumerate(CONCEPT_KEYWORDS)}
+
+@lru_cache(maxsize=1024)
+def resolve_concept_key(question_text):
+    """Return the concept key for a question, or "general" if no keyword matches"""
+    matches = _KEYWORD_PATTERN.findall(question_text.lower())
+    if not matches:
+        return "general"
+    return CONCEPT_KEYWORDS[min(matches, key=_KEYWORD_PRIORITY.__getitem__)]
+
 def get_concept_for_question(question_text):
     """Match question to relevant concept(s)"""
-    question_lower = question_text.lower()
+    return INTERVIEW_CONCEPTS.get(resolve_concept_key(question_text))
+
+def _build_clarification_fragment(concept):
+    """Concept block for clarification prompts (the get_feedback_context text)"""
+    context = f"""
+RELEVANT CONCEPT KNOWLEDGE:
+Definition: {concept['definition']}
+"""
     
-    concept_mapping = {
-        "type i and type ii errors": "type_i_ii_errors",
-        "p-value": "p_value", 
-        "central limit theorem": "central_limit_theorem",
-        "correlation and causation": "correlation_vs_causation",
-        "bias-variance tradeoff": "bias_variance_tradeoff",
-        "class imbalance": "class_imbalance",
-        "bagging and boosting": "bagging_vs_boosting",
-        "linear regression": "linear_regression_assumptions",
-        "a/b test": "ab_test_design",
-        "missing": "missing_data_handling"
-    }
+    # Handle different key structures safely
+    key_info = []
     
-    for keyword, concept in concept_mapping.items():
-        if keyword in question_lower:
-            return INTERVIEW_CONCEPTS.get(concept)
+    # Try different possible key names for main points
+    for key_name in ['key_points', 'key_components', 'assumptions']:
+        if key_name in concept:
+            if isinstance(concept[key_name], list):
+                key_info.extend(concept[key_name])
+            elif isinstance(concept[key_name], dict):
+                # For nested dicts like assumptions
+                key_info.extend([f"{k}: {v}" for k, v in concept[key_name].items()])
+            break
     
-    return None
+    if key_info:
+        context += f"\nKey Points: {', '.join(key_info[:5])}"  # Limit to first 5 points
+    
+    # Add red flags if available
+    if 'interview_red_flags' in concept:
+        context += f"\n\nCommon Interview Red Flags: {', '.join(concept['interview_red_flags'])}"
+    
+    # Add practical application if available
+    practical = concept.get('practical_application', 
+                           concept.get('practical_considerations', 
+                                     concept.get('design_process', 'N/A')))
+    
+    if practical != 'N/A':
+        if isinstance(practical, list):
+            context += f"\n\nPractical Application: {', '.join(practical[:3])}"
+        else:
+            context += f"\n\nPractical Application: {practical}"
+    
+    return context
 
-def get_feedback_context(question_text):
-    """Get relevant knowledge base context for generating feedback"""
-    concept = get_concept_for_question(question_text)
+def _build_feedback_fragment(concept):
+    """Key points and red flags block for feedback prompts"""
+    context_parts = []
+    if 'key_points' in concept and concept['key_points']:
+        # Take top 3 key points
+        points = concept['key_points'][:3]
+        context_parts.append(f"Key points that should be covered: {', '.join(points)}")
     
-    if concept:
-        context = f"""
-RELEVANT CONCEPT KNOWLEDGE:
-Definition: {concept['definition']}
-"""
-        
-        # Handle different key structures safely
-        key_info = []
-        
-        # Try different possible key names for main points
-        for key_name in ['key_points', 'key_components', 'assumptions']:
-            if key_name in concept:
-                if isinstance(concept[key_name], list):
-                    key_info.extend(concept[key_name])
-                elif isinstance(concept[key_name], dict):
-                    # For nested dicts like assumptions
-                    key_info.extend([f"{k}: {v}" for k, v in concept[key_name].items()])
-                break
-        
-        if key_info:
-            context += f"\nKey Points: {', '.join(key_info[:5])}"  # Limit to first 5 points
-        
-        # Add red flags if available
-        if 'interview_red_flags' in concept:
-            context += f"\n\nCommon Interview Red Flags: {', '.join(concept['interview_red_flags'])}"
-        
-        # Add practical application if available
-        practical = concept.get('practical_application', 
-                               concept.get('practical_considerations', 
-                                         concept.get('design_process', 'N/A')))
-        
-        if practical != 'N/A':
-            if isinstance(practical, list):
-                context += f"\n\nPractical Application: {', '.join(practical[:3])}"
-            else:
-                context += f"\n\nPractical Application: {practical}"
-        
-        return context
+    if 'interview_red_flags' in concept and concept['interview_red_flags']:
+        context_parts.append(f"Common mistakes to watch for: {', '.join(concept['interview_red_flags'])}")
     
-    return "No specific concept knowledge found."
\ No newline at end of file
+    return '\n'.join(context_parts)
+
+def _cap(text, max_chars):
+    return text if len(text) <= max_chars else text[:max_chars - 3] + "..."
+
+def _compile_fragments(concept, max_chars):
+    """Build every prompt-context fragment for one concept (None = no concept matched)"""
+    if not concept:
+        return {
+            'feedback': "",
+            'scoring_key_points': "General data science knowledge expected",
+            'scoring_red_flags': "Standard interview evaluation criteria",
+            'clarification': "No specific concept knowledge found.",
+            'followup': ""
+        }
+    
+    fragments = {
+        'feedback': _build_feedback_fragment(concept),
+        'scoring_key_points': ', '.join(concept['key_points']) if 'key_points' in concept else "General data science knowledge expected",
+        'scoring_red_flags': ', '.join(concept['interview_red_flags']) if 'interview_red_flags' in concept else "Standard interview evaluation criteria",
+        'clarification': _build_clarification_fragment(concept),
+        'followup': f"Key concept areas: {', '.join(concept.get('key_points', []))}"
+    }
+    return {name: _cap(text, max_chars) for name, text in fragments.items()}
+
+# Longest any single context fragment may be; one place to bound prompt size per concept
+CONTEXT_FRAGMENT_MAX_CHARS = 2000
+
+# Prompt-context fragments precompiled once at import; the request path only does a dict lookup
+CONCEPT_FRAGMENTS = {
+    concept_key: _compile_fragments(concept, CONTEXT_FRAGMENT_MAX_CHARS)
+    for concept_key, concept in INTERVIEW_CONCEPTS.items()
+}
+_DEFAULT_FRAGMENTS = _compile_fragments(None, CONTEXT_FRAGMENT_MAX_CHARS)
+
+def get_prompt_fragments(question_text):
+    """Precompiled prompt-context fragments for the concept a question is about"""
+    return CONCEPT_FRAGMENTS.get(resolve_concept_key(question_text), _DEFAULT_FRAGMENTS)
+
+def fragment_sizes():
+    """Character length of every precompiled fragment, per concept"""
+    return {
+        concept_key: {name: len(text) for name, text in fragments.items()}
+        for concept_key, fragments in CONCEPT_FRAGMENTS.items()
+    }
+
+# Chunk kind for each concept field; anything else is a general "detail"
+CHUNK_KINDS = {
+    'definition': 'definition',
+    'key_points': 'key_point',
+    'examples': 'example',
+    'diagnostics': 'diagnostic',
+    'common_pitfalls': 'pitfall',
+    'common_misunderstandings': 'pitfall',
+    'interview_red_flags': 'pitfall'
+}
+
+def _field_texts(value, label):
+    """Flatten a concept field into one text per list item / dict entry"""
+    if isinstance(value, str):
+        return [f"{label}: {value}"]
+    if isinstance(value, list):
+        return [f"{label}: {item}" for item in value]
+    if isinstance(value, dict):
+        texts = []
+        for key, item in value.items():
+            texts.extend(_field_texts(item, f"{label} ({key.replace('_', ' ')})"))
+        return texts
+    return []
+
+def concept_chunks():
+    """
+    Split INTERVIEW_CONCEPTS into fine-grained chunks for retrieval: one per
+    definition, key point, example, diagnostic, pitfall and other detail.
+
+    Returns:
+        list: dicts with concept, kind and text
+    """
+    chunks = []
+    for concept_key, concept in INTERVIEW_CONCEPTS.items():
+        title = concept_key.replace('_', ' ')
+        for field, value in concept.items():
+            label = f"{title} - {field.replace('_', ' ')}"
+            for text in _field_texts(value, label):
+                chunks.append({'concept': concept_key, 'kind': CHUNK_KINDS.get(field, 'detail'), 'text': text})
+    return chunks
+
+def get_feedback_context(question_text):
+    """Get relevant knowledge base context for generating feedback"""
+    return get_prompt_fragments(question_text)['clarification']
@@ -0,0 +1,76 @@
+import threading
+import numpy as np
+from config import (
+    EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, INDEX_ARTIFACT_DIR, VECTOR_INDEX_BACKEND,
+    RETRIEVAL_CANDIDATE_FACTOR, CLARIFICATION_CONTEXT_TOP_K, KB_CONCEPT_BOOST
+)
+from knowledge_base import concept_chunks, get_feedback_context, resolve_concept_key
+from index_artifact import load_kb_artifact
+from vector_index import build_index
+
+class KnowledgeRetriever:
+    """Embedding search over fine-grained INTERVIEW_CONCEPTS chunks"""
+
+    def __init__(self, embedder, model_name=EMBEDDING_MODEL_NAME, embedding_backend=EMBEDDING_BACKEND,
+                 index_backend=VECTOR_INDEX_BACKEND):
+        self.embedder = embedder
+        if not embedder.can_encode:
+            # No model to embed questions with; callers fall back to whole concept blocks
+            self.index = None
+            return
+
+        artifact = load_kb_artifact(INDEX_ARTIFACT_DIR, model_name, embedding_backend)
+        if artifact is not None:
+            self.chunks = artifact['chunks']
+            self.chunk_embeddings = artifact['embeddings']
+        else:
+            self.chunks = concept_chunks()
+            self.chunk_embeddings = embedder.encode([chunk['text'] for chunk in self.chunks], normalize_embeddings=True)
+        self.chunk_concepts = np.array([chunk['concept'] for chunk in self.chunks])
+        self.index = build_index(self.chunk_embeddings, index_backend)
+
+    def retrieve(self, original_question, student_question, top_k=CLARIFICATION_CONTEXT_TOP_K):
+        """
+        Return the top_k chunks most relevant to the student's question.
+
+        Ranking is cosine similarity to the student's question, with a small
+        boost for chunks from the original question's concept so cross-topic
+        questions can still pull in other concepts.
+        """
+        query_embedding = self.embedder.encode([student_question], normalize_embeddings=True)
+        n_candidates = len(self.index) if self.index.exact else min(len(self.index), top_k * RETRIEVAL_CANDIDATE_FACTOR)
+        sim, candidates = self.index.search(query_embedding, n_candidates)
+        found = candidates[0] >= 0
+        sim, candidates = sim[0][found], candidates[0][found]
+
+        concept_match = (self.chunk_concepts[candidates] == resolve_concept_key(original_question)).astype(np.float32)
+        final = sim + KB_CONCEPT_BOOST * concept_match
+        top = candidates[np.argsort(-final, kind='stable')[:top_k]]
+        return [self.chunks[i] for i in top]
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+def get_knowledge_retriever():
+    """Return the process-wide KnowledgeRetriever, sharing the follow-up generator's embedder"""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                # Imported lazily to keep this module import-cheap like followup_generator
+                from followup_generator import get_followup_generator
+                _retriever = KnowledgeRetriever(get_followup_generator().embedder)
+    return _retriever
+
+def get_clarification_context(original_question, student_question, top_k=CLARIFICATION_CONTEXT_TOP_K):
+    """
+    Knowledge-base context for a clarification: only the chunks relevant to
+    what the student asked. Falls back to the whole concept block when no
+    embedding model is available.
+    """
+    retriever = get_knowledge_retriever()
+    if retriever.index is None:
+        return get_feedback_context(original_question)
+
+    chunks = retriever.retrieve(original_question, student_question, top_k)
+    return "RELEVANT CONCEPT KNOWLEDGE:\n" + "\n".join(f"- {chunk['text']}" for chunk in chunks)
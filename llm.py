@@ -0,0 +1,136 @@
+from config import get_client, MODEL_NAME, RATE_LIMIT_MAX_WAIT_SECONDS, RESPONSE_CACHE_ENABLED
+from rate_limiter import get_rate_limiter
+from resilience import resilient_call
+from response_cache import get_response_cache
+from token_budget import count_message_tokens, count_tokens, record_usage
+from tracing import set_attributes, span
+
+def _record_response_usage(call_site, model, messages, text, usage):
+    """Record provider-reported token counts, counting locally if the response has none"""
+    if usage is not None:
+        prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+    else:
+        prompt_tokens, completion_tokens = count_message_tokens(messages, model), count_tokens(text or '', model)
+    record_usage(call_site, prompt_tokens, completion_tokens)
+    set_attributes(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return prompt_tokens + completion_tokens
+
+def _send(call_site, reserved_tokens, timeout, **request):
+    """
+    Send one request attempt, first waiting for rate-limit capacity.
+
+    The wait comes out of the attempt's timeout and never exceeds
+    RATE_LIMIT_MAX_WAIT_SECONDS. reserved_tokens (prompt plus max_tokens) is
+    what the limiter's tokens-per-minute bucket is charged; a failed attempt
+    gives it all back, so retries don't pay for the same call twice.
+    """
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return get_client().chat.completions.create(timeout=timeout, **request)
+    waited = limiter.acquire(call_site, reserved_tokens, max_wait=min(timeout, RATE_LIMIT_MAX_WAIT_SECONDS))
+    set_attributes(rate_limit_wait_ms=round(waited * 1000, 1))
+    try:
+        return get_client().chat.completions.create(timeout=max(timeout - waited, 1.0), **request)
+    except Exception:
+        limiter.refund(reserved_tokens)
+        raise
+
+def _refund_unused(reserved_tokens, used_tokens):
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        limiter.refund(reserved_tokens - used_tokens)
+
+def chat_completion(messages, max_tokens, temperature, call_site, model=MODEL_NAME, cache=False, semantic_text=None,
+                    response_format=None, deadline=None):
+    """
+    Send a chat completion through the shared client and return its text.
+
+    Provider calls go through resilient_call (deadline, retries on 429/5xx,
+    circuit breaker); errors that survive it are raised unchanged so each
+    caller keeps its own fallback.
+
+    Args:
+        messages (list): Chat messages
+        max_tokens (int): Output token cap
+        temperature (float): Sampling temperature
+        call_site (str): Name token usage is recorded under (e.g. "feedback")
+        model (str): Model name
+        cache (bool): Serve and store this call through the response cache
+        semantic_text (str): Free-text part of the prompt (e.g. the student's
+            answer) used for near-duplicate lookups
+        response_format (dict): Optional structured-output format (e.g. a JSON schema)
+        deadline (float): Seconds the call may take, retries included
+            (defaults to LLM_CALL_DEADLINE_SECONDS)
+
+    Returns:
+        str: The completion text
+    """
+    with span(f"llm.{call_site}", model=model):
+        response_cache = get_response_cache() if cache and RESPONSE_CACHE_ENABLED else None
+        if response_cache is not None:
+            cached = response_cache.get(model, messages, temperature, max_tokens, semantic_text)
+            if cached is not None:
+                record_usage(call_site, cached=True)
+                set_attributes(cache_hit=True)
+                return cached
+
+        extra_options = {"response_format": response_format} if response_format else {}
+        reserved_tokens = count_message_tokens(messages, model) + max_tokens
+        response = resilient_call(lambda timeout: _send(
+            call_site, reserved_tokens, timeout,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **extra_options
+        ), deadline)
+        text = response.choices[0].message.content
+        _refund_unused(reserved_tokens, _record_response_usage(call_site, model, messages, text, response.usage))
+
+        if response_cache is not None and text is not None:
+            response_cache.put(model, messages, temperature, max_tokens, text, semantic_text)
+        return text
+
+def chat_completion_stream(messages, max_tokens, temperature, call_site, model=MODEL_NAME, cache=False, semantic_text=None,
+                           deadline=None):
+    """
+    Streaming variant of chat_completion: yields text chunks as they arrive.
+
+    A cache hit yields the whole cached text as one chunk. The joined text of
+    a completed stream is stored in the cache exactly as chat_completion would.
+    Opening the stream is retried like chat_completion; an error mid-stream
+    is raised to the caller.
+    """
+    with span(f"llm.{call_site}", model=model):
+        response_cache = get_response_cache() if cache and RESPONSE_CACHE_ENABLED else None
+        if response_cache is not None:
+            cached = response_cache.get(model, messages, temperature, max_tokens, semantic_text)
+            if cached is not None:
+                record_usage(call_site, cached=True)
+                set_attributes(cache_hit=True)
+                yield cached
+                return
+
+        reserved_tokens = count_message_tokens(messages, model) + max_tokens
+        stream = resilient_call(lambda timeout: _send(
+            call_site, reserved_tokens, timeout,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        ), deadline)
+        chunks = []
+        usage = None
+        for chunk in stream:
+            # The usage-only chunk arrives last, with no choices
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        _refund_unused(reserved_tokens, _record_response_usage(call_site, model, messages, ''.join(chunks), usage))
+
+        if response_cache is not None and chunks:
+            response_cache.put(model, messages, temperature, max_tokens, ''.join(chunks), semantic_text)
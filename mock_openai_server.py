@@ -0,0 +1,151 @@
+"""
+Local OpenAI-compatible stand-in for benchmarks and offline runs.
+
+Serves POST /v1/chat/completions (plain and streaming) with canned text,
+configurable latency and injected failures. Replies follow the shape of what
+the app asks for: a bare 1-5 digit for scoring calls (max_tokens <= 10), a
+{"feedback", "score"} JSON object when a response_format is given, and
+interview-coach prose otherwise.
+
+Usage:
+    python mock_openai_server.py [--port 8765] [--latency-ms 300] [--jitter-ms 100]
+                                 [--failure-rate 0.0] [--seed 0]
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FEEDBACK_TEXT = ("You clearly understand the core idea and gave a sensible definition. "
+                 "The main gap is that you did not mention how this shows up in practice. "
+                 "Try adding a concrete example from a project you have worked on.")
+FOLLOWUP_TEXT = "How would you detect this problem in a model you had already deployed?"
+
+class MockSettings:
+    """Latency and failure injection shared by all handler threads"""
+
+    def __init__(self, latency_ms=300.0, jitter_ms=100.0, failure_rate=0.0, stream_chunks=8, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.stream_chunks = stream_chunks
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """(latency in seconds, HTTP status to fail with or None, score to reply with) for one request"""
+        with self._lock:
+            latency = max(0.0, self._random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+            failure = None
+            if self._random.random() < self.failure_rate:
+                failure = self._random.choice([429, 500, 503])
+            score = self._random.randint(2, 4)
+        return latency, failure, score
+
+def reply_text(body, score):
+    """Canned completion text matching the kind of request the app made"""
+    if body.get("response_format"):
+        return json.dumps({"feedback": FEEDBACK_TEXT, "score": score})
+    if body.get("max_tokens", 0) <= 10:
+        return str(score)
+    if body.get("max_tokens", 0) <= 150:
+        return FOLLOWUP_TEXT
+    return FEEDBACK_TEXT
+
+def make_handler(settings):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this Nagle + delayed ACK adds ~40 ms per reply
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+
+            latency, failure, score = settings.draw()
+            time.sleep(latency)
+            if failure is not None:
+                self._send_json(failure, {"error": {"message": "Injected failure", "type": "mock_error"}})
+                return
+
+            text = reply_text(body, score)
+            prompt_tokens = sum(len(str(message.get("content", ""))) for message in body.get("messages", [])) // 4
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4,
+                     "total_tokens": prompt_tokens + len(text) // 4}
+            base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": body.get("model", "mock")}
+
+            if not body.get("stream"):
+                self._send_json(200, {
+                    **base, "object": "chat.completion", "usage": usage,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": text}}]
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            step = max(1, len(text) // settings.stream_chunks)
+            for start in range(0, len(text), step):
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "finish_reason": None,
+                                      "delta": {"content": text[start:start + step]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            if (body.get("stream_options") or {}).get("include_usage"):
+                chunk = {**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+    return Handler
+
+def start_server(port=0, settings=None):
+    """
+    Start the mock server on a daemon thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server (its base URL is
+        http://127.0.0.1:<server.server_port>/v1)
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(settings or MockSettings()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-openai", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible mock server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="Latency standard deviation")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered 429/5xx")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    settings = MockSettings(args.latency_ms, args.jitter_ms, args.failure_rate, seed=args.seed)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(settings))
+    print(f"Mock OpenAI server on http://127.0.0.1:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from config import (
+    PIPELINE_MAX_WORKERS, COMBINED_FEEDBACK_SCORING, SPECULATIVE_FOLLOWUP, SPECULATIVE_FOLLOWUP_TYPE
+)
+from feedback_generator import (
+    generate_feedback, generate_feedback_stream, evaluate_answer_quality, score_answer, generate_feedback_and_score
+)
+from followup_generator import get_followup_generator
+from followup_policy import (
+    LLM_PATH, DRAFT_USED, DRAFT_DISCARDED, DRAFT_CANCELLED, DRAFT_EMPTY, get_followup_policy
+)
+from tracing import in_current_context, set_attributes, span
+
+# Shared by every session in the process; the work is I/O bound (OpenAI round trips)
+_executor = ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix="pipeline")
+
+def _submit(fn, *args):
+    """Submit to the shared pool, keeping the caller's trace context"""
+    return _executor.submit(in_current_context(fn), *args)
+
+def _start_feedback(question, user_answer, iteration, render_feedback):
+    """
+    Start feedback generation and return a future for its text.
+
+    Without a renderer, feedback is requested on the pool. With one, feedback
+    is streamed through render_feedback(chunks) -> full text on the calling
+    thread (st.write_stream must run on the script thread), so this returns
+    once streaming has finished.
+    """
+    if render_feedback is None:
+        return _submit(generate_feedback, question, user_answer, iteration)
+
+    return _resolved(render_feedback(generate_feedback_stream(question, user_answer, iteration)))
+
+def _resolved(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+def _assess(question, user_answer, iteration, render_feedback, score=evaluate_answer_quality):
+    """
+    Get feedback and the quality score for an answer.
+
+    In combined mode one structured completion returns both; if it fails or
+    doesn't validate we fall back to the concurrent two-call path, scoring
+    with score(question, user_answer).
+
+    Returns:
+        tuple: (future for the feedback text, quality score)
+    """
+    if COMBINED_FEEDBACK_SCORING:
+        combined = generate_feedback_and_score(question, user_answer, iteration)
+        if combined is not None:
+            feedback, quality_score = combined
+            if render_feedback is not None:
+                feedback = render_feedback(iter([feedback]))
+            return _resolved(feedback), quality_score
+
+    score_future = _submit(score, question, user_answer)
+    feedback_future = _start_feedback(question, user_answer, iteration, render_feedback)
+    return feedback_future, score_future.result()
+
+def _draft_followup(question, user_answer, deadline):
+    """Speculative follow-up draft for SPECULATIVE_FOLLOWUP_TYPE (None on error)"""
+    with span("followup_draft", followup_type=SPECULATIVE_FOLLOWUP_TYPE):
+        return get_followup_generator().draft_followup_question(
+            question, user_answer, SPECULATIVE_FOLLOWUP_TYPE, deadline
+        )
+
+def _drop_draft(draft_future):
+    """Cancel an unwanted draft, counting it as discarded if its call had already started"""
+    cancelled = draft_future.cancel()
+    get_followup_policy().record_draft(DRAFT_CANCELLED if cancelled else DRAFT_DISCARDED)
+
+def _followup(question, user_answer, feedback, quality_score, is_revision, draft_future, deadline):
+    """
+    Produce the follow-up once feedback and score are known.
+
+    A speculative draft is used only when the real follow-up type matches the
+    one it was drafted for; otherwise it is cancelled (or, if already running,
+    its result is ignored) and the follow-up is generated as usual. A draft
+    still running at the deadline is abandoned the same way, so the policy
+    can serve the best pattern instead.
+    """
+    generator = get_followup_generator()
+
+    if not generator.should_ask_followup(quality_score, feedback, is_revision):
+        if draft_future is not None:
+            _drop_draft(draft_future)
+        return None
+
+    if draft_future is not None:
+        if generator.determine_followup_type(quality_score, feedback) == SPECULATIVE_FOLLOWUP_TYPE:
+            try:
+                draft = draft_future.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except TimeoutError:
+                draft = None
+                get_followup_policy().record_draft(DRAFT_DISCARDED)
+            else:
+                get_followup_policy().record_draft(DRAFT_USED if draft else DRAFT_EMPTY)
+            if draft:
+                get_followup_policy().record_path(LLM_PATH)
+                set_attributes(followup_path="draft")
+                return draft
+        else:
+            _drop_draft(draft_future)
+
+    return generator.generate_followup_question(question, user_answer, feedback, quality_score, deadline)
+
+def process_answer(question, user_answer, iteration=1, is_revision=False, render_feedback=None, deadline=None):
+    """
+    Run the "Submit Answer" stage: feedback, quality score and follow-up.
+
+    Feedback and scoring are requested concurrently (or as one structured
+    call when COMBINED_FEEDBACK_SCORING is on). As soon as the score is
+    known we decide whether a follow-up is needed, and generate it once the
+    feedback it builds on has arrived. With SPECULATIVE_FOLLOWUP on, a
+    follow-up is drafted alongside scoring and reused when it still fits.
+    Each generator keeps its own fallback
+    (error message, default score, pattern follow-up) exactly as when called
+    directly.
+
+    Args:
+        question (str): The interview question
+        user_answer (str): The student's answer
+        iteration (int): Attempt number for this question
+        is_revision (bool): Whether this answer revises an earlier attempt
+        render_feedback (callable): Optional; streams feedback chunks to the UI
+            and returns the full text
+        deadline (float): Optional time.monotonic() by which the follow-up is
+            needed; if too little time is left the best stored pattern is used
+
+    Returns:
+        dict: feedback, quality_score and followup (None if not warranted)
+    """
+    # Build the shared generator (model load on a cold worker) while the LLM calls are in flight
+    _submit(get_followup_generator)
+
+    draft_future = None
+    if SPECULATIVE_FOLLOWUP:
+        draft_future = _submit(_draft_followup, question, user_answer, deadline)
+
+    with span("assess", combined=COMBINED_FEEDBACK_SCORING):
+        feedback_future, quality_score = _assess(question, user_answer, iteration, render_feedback)
+        feedback = feedback_future.result()
+        set_attributes(quality_score=quality_score)
+
+    followup_question = None
+    if quality_score >= 3 or is_revision:
+        # Runs on the calling thread so pool workers never block on each other
+        with span("followup"):
+            followup_question = _followup(
+                question,
+                user_answer,
+                feedback,
+                quality_score,
+                is_revision,
+                draft_future,
+                deadline
+            )
+    elif draft_future is not None:
+        _drop_draft(draft_future)
+
+    return {
+        "feedback": feedback,
+        "quality_score": quality_score,
+        "followup": followup_question
+    }
+
+def process_followup_answer(followup_question, followup_answer, render_feedback=None):
+    """
+    Run feedback and scoring for a follow-up answer concurrently.
+
+    Returns:
+        tuple: (feedback, quality_score)
+    """
+    with span("assess"):
+        feedback_future, quality_score = _assess(followup_question, followup_answer, 1, render_feedback)
+        set_attributes(quality_score=quality_score)
+        return feedback_future.result(), quality_score
+
+def grade_answer(question, user_answer):
+    """
+    Feedback and score for a standalone answer, as used by bulk grading (no follow-up).
+
+    Unlike the app, a failed score is not replaced by the default of 2, so the
+    caller can tell it apart from a real one.
+
+    Returns:
+        tuple: (feedback, quality_score or None if scoring failed)
+    """
+    with span("assess"):
+        feedback_future, quality_score = _assess(question, user_answer, 1, None, score_answer)
+        set_attributes(quality_score=quality_score)
+        return feedback_future.result(), quality_score
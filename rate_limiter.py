@@ -0,0 +1,214 @@
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import (
+    RATE_LIMIT_ENABLED, OPENAI_CASSETTE_MODE, RATE_LIMIT_RPM, RATE_LIMIT_TPM, RATE_LIMIT_BURST_SECONDS, RATE_LIMIT_MAX_WAIT_SECONDS,
+    RATE_LIMIT_BACKEND, RATE_LIMIT_SQLITE_PATH, LLM_CALL_PRIORITIES, DEFAULT_CALL_PRIORITY
+)
+
+# Lets a caller (e.g. bulk grading) run its calls below the interactive classes
+_priority_override = ContextVar("rate_limit_priority", default=None)
+
+class RateLimitTimeout(Exception):
+    """Raised when capacity did not free up within the caller's wait budget"""
+
+@contextmanager
+def priority(level):
+    """Run the LLM calls made inside this block (and in work it submits with the context) at this priority"""
+    token = _priority_override.set(level)
+    try:
+        yield
+    finally:
+        _priority_override.reset(token)
+
+class MemoryBuckets:
+    """Requests-per-minute and tokens-per-minute token buckets for this process"""
+
+    def __init__(self, limits, burst_seconds):
+        # limits: {bucket name: per-minute rate}; each bucket holds burst_seconds worth of it
+        self.rates = {name: limit / 60.0 for name, limit in limits.items()}
+        self.capacities = {name: rate * burst_seconds for name, rate in self.rates.items()}
+        self._levels = dict(self.capacities)
+        self._updated = time.monotonic()
+
+    def try_consume(self, amounts):
+        """
+        Take amounts from every bucket, or from none of them.
+
+        Returns:
+            float: 0 on success, else the seconds until they would all fit
+        """
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        for name, rate in self.rates.items():
+            self._levels[name] = min(self.capacities[name], self._levels[name] + elapsed * rate)
+        return _consume(self._levels, self.rates, self.capacities, amounts)
+
+    def refund(self, name, amount):
+        self._levels[name] = min(self.capacities[name], self._levels[name] + amount)
+
+class SqliteBuckets(MemoryBuckets):
+    """The same buckets kept in a SQLite file so every process on the host shares one budget"""
+
+    def __init__(self, limits, burst_seconds, path):
+        super().__init__(limits, burst_seconds)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL, updated REAL)")
+
+    def _transaction(self, update):
+        # BEGIN IMMEDIATE takes the write lock up front, so read-refill-write is atomic across processes
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            stored = dict((name, (level, updated)) for name, level, updated
+                          in self._db.execute("SELECT name, level, updated FROM buckets"))
+            levels = {}
+            for name, rate in self.rates.items():
+                level, updated = stored.get(name, (self.capacities[name], now))
+                levels[name] = min(self.capacities[name], level + max(0.0, now - updated) * rate)
+            result = update(levels)
+            self._db.executemany("INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                                 [(name, level, now) for name, level in levels.items()])
+            self._db.execute("COMMIT")
+            return result
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def try_consume(self, amounts):
+        return self._transaction(lambda levels: _consume(levels, self.rates, self.capacities, amounts))
+
+    def refund(self, name, amount):
+        def add(levels):
+            levels[name] = min(self.capacities[name], levels[name] + amount)
+        self._transaction(add)
+
+def _consume(levels, rates, capacities, amounts):
+    # A request bigger than a whole bucket could never fit; let it through once the bucket is full
+    amounts = {name: min(amount, capacities[name]) for name, amount in amounts.items()}
+    shortfall = max((amounts[name] - levels[name]) / rates[name] for name in amounts)
+    if shortfall > 0:
+        return shortfall
+    for name, amount in amounts.items():
+        levels[name] -= amount
+    return 0.0
+
+class RateLimiter:
+    """
+    Process-wide governor for LLM calls: RPM/TPM token buckets behind a priority queue.
+
+    Waiting calls are served strictly by priority class (lower first) and in
+    arrival order within a class, so interactive feedback and scoring are
+    never stuck behind a queue of follow-ups, clarifications or bulk grading.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._condition = threading.Condition()
+        self._waiting = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._stats = {}
+
+    def acquire(self, call_site, tokens, max_wait=RATE_LIMIT_MAX_WAIT_SECONDS):
+        """
+        Block until there is capacity for one request of `tokens` tokens.
+
+        Returns:
+            float: Seconds spent waiting
+
+        Raises:
+            RateLimitTimeout: Capacity did not free up within max_wait seconds
+        """
+        level = _priority_override.get()
+        if level is None:
+            level = LLM_CALL_PRIORITIES.get(call_site, DEFAULT_CALL_PRIORITY)
+        ticket = (level, next(self._sequence))
+        started = time.monotonic()
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    retry_in = None
+                    if self._waiting[0] == ticket:
+                        retry_in = self.buckets.try_consume({"requests": 1, "tokens": tokens})
+                        if retry_in == 0:
+                            waited = time.monotonic() - started
+                            self._record(level, waited)
+                            return waited
+                    remaining = max_wait - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._record(level, time.monotonic() - started, timed_out=True)
+                        raise RateLimitTimeout(f"No LLM capacity for {call_site} within {max_wait:.1f}s")
+                    # Other processes can free capacity too (SQLite backend), so never sleep long
+                    self._condition.wait(min(remaining, retry_in if retry_in else 0.25, 0.25))
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+    def refund(self, tokens):
+        """Return reserved tokens a call did not use (reservations assume the full max_tokens)"""
+        if tokens > 0:
+            with self._condition:
+                self.buckets.refund("tokens", tokens)
+                self._condition.notify_all()
+
+    def _record(self, level, waited, timed_out=False):
+        stats = self._stats.setdefault(level, {'acquired': 0, 'timeouts': 0, 'total_wait': 0.0, 'max_wait': 0.0})
+        if timed_out:
+            stats['timeouts'] += 1
+        else:
+            stats['acquired'] += 1
+            stats['total_wait'] += waited
+            stats['max_wait'] = max(stats['max_wait'], waited)
+
+    def report(self):
+        """Queue depth and wait times per priority class"""
+        with self._condition:
+            depth = {}
+            for level, _ in self._waiting:
+                depth[level] = depth.get(level, 0) + 1
+            report = {}
+            for level in sorted(set(depth) | set(self._stats)):
+                stats = self._stats.get(level, {'acquired': 0, 'timeouts': 0, 'total_wait': 0.0, 'max_wait': 0.0})
+                report[level] = {
+                    'queue_depth': depth.get(level, 0),
+                    'acquired': stats['acquired'],
+                    'timeouts': stats['timeouts'],
+                    'avg_wait': stats['total_wait'] / stats['acquired'] if stats['acquired'] else 0.0,
+                    'max_wait': stats['max_wait']
+                }
+            return report
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """The process-wide limiter (None when RATE_LIMIT_ENABLED is off or cassettes are replayed)"""
+    global _limiter
+    # Replayed calls never reach the provider, so there is no quota to protect
+    if not RATE_LIMIT_ENABLED or OPENAI_CASSETTE_MODE == "replay":
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                limits = {"requests": RATE_LIMIT_RPM, "tokens": RATE_LIMIT_TPM}
+                if RATE_LIMIT_BACKEND == "sqlite":
+                    buckets = SqliteBuckets(limits, RATE_LIMIT_BURST_SECONDS, RATE_LIMIT_SQLITE_PATH)
+                else:
+                    buckets = MemoryBuckets(limits, RATE_LIMIT_BURST_SECONDS)
+                _limiter = RateLimiter(buckets)
+    return _limiter
+
+def limiter_report():
+    """Queue depth and wait-time metrics per priority class ({} when disabled)"""
+    limiter = get_rate_limiter()
+    return limiter.report() if limiter is not None else {}
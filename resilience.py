@@ -0,0 +1,145 @@
+import random
+import threading
+import time
+from tenacity import Retrying, retry_if_exception, stop_after_attempt
+from config import (
+    LLM_CALL_DEADLINE_SECONDS, LLM_MAX_ATTEMPTS, LLM_RETRY_BASE_SECONDS, LLM_RETRY_MAX_SECONDS,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, HTTP_READ_TIMEOUT
+)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit breaker is open"""
+
+class CallDeadlineExceeded(Exception):
+    """Raised when a call's deadline passes before an attempt could be made"""
+
+def is_retryable(error):
+    """429s, 5xx, timeouts and connection errors are worth retrying; other errors are not"""
+    import openai
+    if isinstance(error, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+def _provider_answered(error):
+    import openai
+    return isinstance(error, openai.APIStatusError)
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over consecutive provider failures.
+
+    After failure_threshold retryable failures in a row the circuit opens and
+    calls fail fast with CircuitOpenError. Once reset_seconds have passed a
+    single probe call is let through (half-open); its success closes the
+    circuit and its failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """Whether a call may go to the provider now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self):
+        """End a half-open probe that never reached the provider, without changing state"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def reset(self):
+        self.record_success()
+
+_breaker = CircuitBreaker()
+
+def get_circuit_breaker():
+    """The process-wide breaker for OpenAI calls"""
+    return _breaker
+
+def resilient_call(request, deadline=None):
+    """
+    Run a provider request with a deadline, jittered exponential retries and the circuit breaker.
+
+    Args:
+        request (callable): request(timeout) -> response; timeout is the
+            seconds left for this attempt (passed to the client as its timeout)
+        deadline (float): Seconds the whole call, retries included, may take
+            (defaults to LLM_CALL_DEADLINE_SECONDS)
+
+    Returns:
+        The response of the first successful attempt
+
+    Raises:
+        CircuitOpenError: The breaker is open (callers fall back as on any error)
+        CallDeadlineExceeded: No time was left for another attempt
+        The provider error of the last attempt, if it was not retryable or
+        attempts ran out
+    """
+    deadline_at = time.monotonic() + (deadline if deadline is not None else LLM_CALL_DEADLINE_SECONDS)
+
+    def wait(retry_state):
+        # Full-jitter exponential backoff, never sleeping past the deadline
+        backoff = min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** (retry_state.attempt_number - 1))
+        return min(random.uniform(0, backoff), max(0.0, deadline_at - time.monotonic()))
+
+    retrying = Retrying(
+        stop=stop_after_attempt(LLM_MAX_ATTEMPTS),
+        wait=wait,
+        retry=retry_if_exception(is_retryable),
+        reraise=True
+    )
+    for attempt in retrying:
+        with attempt:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise CallDeadlineExceeded("LLM call deadline exceeded")
+            if not _breaker.allow():
+                raise CircuitOpenError("OpenAI circuit breaker is open")
+            try:
+                response = request(min(remaining, HTTP_READ_TIMEOUT))
+            except Exception as e:
+                if is_retryable(e):
+                    _breaker.record_failure()
+                elif _provider_answered(e):
+                    # A bad request says nothing about the provider's health
+                    _breaker.record_success()
+                else:
+                    # Failed before reaching the provider (e.g. a rate-limiter timeout)
+                    _breaker.release_probe()
+                raise
+            _breaker.record_success()
+            return response
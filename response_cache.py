@@ -0,0 +1,182 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from config import (
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_SEMANTIC, RESPONSE_CACHE_SIMILARITY_THRESHOLD
+)
+
+def cache_key(model, messages, temperature, max_tokens):
+    """Stable hash of everything that determines a completion"""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+EMBEDDING_MEMO_SIZE = 256  # recent semantic_text embeddings, so a miss's put() reuses its get()'s
+
+def _embed(text):
+    """Unit-normalised MiniLM embedding from the follow-up generator's model (None without a model)"""
+    # Imported lazily: followup_generator itself sends completions through this cache's caller
+    from followup_generator import get_followup_generator
+    embedder = get_followup_generator().embedder
+    if not embedder.can_encode:
+        return None
+    return embedder.encode([text], normalize_embeddings=True)[0]
+
+class ResponseCache:
+    """
+    Bounded LRU/TTL cache of completion texts.
+
+    The exact tier is keyed on a hash of model, messages, temperature and
+    max_tokens. The optional semantic tier serves near-duplicates: when a
+    caller names the free-text part of the prompt (semantic_text, usually the
+    student's answer), a miss falls back to any entry whose prompt is identical
+    apart from that text and whose text embedding is within the similarity
+    threshold.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+                 semantic=RESPONSE_CACHE_SEMANTIC, similarity_threshold=RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+                 embed=_embed):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic = semantic
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> {'expires_at', 'text', 'namespace', 'embedding'}
+        self._embeddings = OrderedDict()  # semantic_text -> embedding (None without a model)
+        self._lock = threading.Lock()
+
+    def _embedding(self, text):
+        """Embedding of text, encoded at most once while it stays among the recent texts"""
+        with self._lock:
+            if text in self._embeddings:
+                self._embeddings.move_to_end(text)
+                return self._embeddings[text]
+        embedding = self.embed(text)
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._embeddings[text] = embedding
+            while len(self._embeddings) > EMBEDDING_MEMO_SIZE:
+                self._embeddings.popitem(last=False)
+        return embedding
+
+    def _namespace(self, model, messages, temperature, max_tokens, semantic_text):
+        """Key shared by prompts that differ only in their semantic_text"""
+        masked = [
+            {**message, 'content': message['content'].replace(semantic_text, '\0')}
+            for message in messages
+        ]
+        return cache_key(model, masked, temperature, max_tokens)
+
+    def _evict_expired(self, now):
+        expired = [key for key, entry in self._entries.items() if entry['expires_at'] <= now]
+        for key in expired:
+            del self._entries[key]
+
+    def get(self, model, messages, temperature, max_tokens, semantic_text=None):
+        """Return a cached completion text, or None on a miss"""
+        key = cache_key(model, messages, temperature, max_tokens)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires_at'] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['text']
+
+        if self.semantic and semantic_text:
+            text = self._semantic_get(model, messages, temperature, max_tokens, semantic_text, now)
+            if text is not None:
+                return text
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _semantic_get(self, model, messages, temperature, max_tokens, semantic_text, now):
+        namespace = self._namespace(model, messages, temperature, max_tokens, semantic_text)
+        with self._lock:
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry['namespace'] == namespace and entry['embedding'] is not None
+                and entry['expires_at'] > now
+            ]
+        if not candidates:
+            return None
+
+        query = self._embedding(semantic_text)
+        if query is None:
+            return None
+        similarities = np.stack([entry['embedding'] for _, entry in candidates]) @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+
+        key, entry = candidates[best]
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+            self.semantic_hits += 1
+        return entry['text']
+
+    def put(self, model, messages, temperature, max_tokens, text, semantic_text=None):
+        """Store a completion text, evicting expired then least recently used entries"""
+        key = cache_key(model, messages, temperature, max_tokens)
+        namespace = None
+        embedding = None
+        if self.semantic and semantic_text:
+            namespace = self._namespace(model, messages, temperature, max_tokens, semantic_text)
+            embedding = self._embedding(semantic_text)
+
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = {
+                'expires_at': now + self.ttl_seconds,
+                'text': text,
+                'namespace': namespace,
+                'embedding': embedding
+            }
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._evict_expired(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._entries)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._embeddings.clear()
+
+_response_cache = ResponseCache()
+
+def get_response_cache():
+    """Return the process-wide response cache"""
+    return _response_cache
+
+def cache_report():
+    """Hit/miss counters of the response cache ({} when RESPONSE_CACHE_ENABLED is off)"""
+    return _response_cache.stats() if RESPONSE_CACHE_ENABLED else {}
@@ -0,0 +1,57 @@
+"""
+Report how long importing the app's modules takes, broken down per module.
+
+Runs the imports in a fresh interpreter with `python -X importtime` and sums
+the self time of every imported module under its top-level package, so heavy
+dependencies (torch, transformers, openai, ...) stand out.
+
+Usage:
+    python startup_report.py [--top 15] [module ...]
+"""
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+
+APP_MODULES = ["config", "knowledge_base", "llm", "feedback_generator", "followup_generator",
+               "clarification_handler", "pipeline"]
+
+def measure_imports(modules):
+    """Return {top-level package: self time in ms} and the total wall time in ms"""
+    code = "import " + ", ".join(modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {modules} failed:\n{result.stderr}")
+
+    per_package = defaultdict(float)
+    total_us = 0
+    for line in result.stderr.splitlines():
+        # Format: "import time: <self us> | <cumulative us> | <indented module name>"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, raw_name = line[len("import time:"):].split("|")
+        name = raw_name.strip()
+        per_package[name.split(".")[0]] += int(self_us) / 1000
+        # Nested imports are indented further; top-level cumulative times add up to the total
+        if not raw_name.startswith("  "):
+            total_us += int(cumulative_us)
+    return dict(per_package), total_us / 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Break down app import time per module")
+    parser.add_argument("modules", nargs="*", default=APP_MODULES)
+    parser.add_argument("--top", type=int, default=15, help="Number of packages to show")
+    args = parser.parse_args()
+
+    per_package, total_ms = measure_imports(args.modules)
+    print(f"Total import time: {total_ms:.1f} ms")
+    print(f"{'package':<30}{'self ms':>10}{'share':>8}")
+    for package, ms in sorted(per_package.items(), key=lambda item: -item[1])[:args.top]:
+        share = ms / total_ms if total_ms else 0.0
+        print(f"{package:<30}{ms:>10.1f}{share:>8.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Prompt token counting, per-call input budgets and token usage accounting.
+
+Budgets are enforced on a fixed ~4 characters/token estimate, so a given
+text is always cut the same way: early or late in a process, online or
+offline. The prompt, and with it response-cache and cassette keys, depends
+only on the input.
+
+Accounting (count_tokens, count_message_tokens) uses the model's tiktoken
+encoding once it has loaded, and the same estimate until then, or for good if
+it can't be loaded (not installed, unknown model, or offline with no cached
+BPE file). Loading can mean downloading the BPE file, so it happens on a
+background thread, started by warm_up_encoding() or by the first count, and
+never on a request's path.
+"""
+import threading
+import time
+from collections import deque
+from config import MODEL_NAME, PROCESS_TOKEN_BUDGET_WINDOW_SECONDS
+
+TRUNCATION_MARKER = " [...] "
+CHARS_PER_TOKEN = 4
+
+_encodings = {}  # model -> tiktoken encoding, or None if it could not be loaded
+_encodings_lock = threading.Lock()
+_loading = set()
+
+def _load_encoding(model):
+    try:
+        import tiktoken
+        encoding = tiktoken.encoding_for_model(model)
+    except Exception:  # not installed, unknown model, or BPE file unavailable offline
+        encoding = None
+    with _encodings_lock:
+        _encodings[model] = encoding
+        _loading.discard(model)
+
+def _encoding(model):
+    """The model's encoding if loaded, else None (starting the load once per model)"""
+    with _encodings_lock:
+        if model in _encodings:
+            return _encodings[model]
+        if model in _loading:
+            return None
+        _loading.add(model)
+    threading.Thread(target=_load_encoding, args=(model,), name="tiktoken-load", daemon=True).start()
+    return None
+
+def warm_up_encoding(model=MODEL_NAME):
+    """Start loading the model's encoding so counts are exact by the first request"""
+    _encoding(model)
+
+def estimate_tokens(text):
+    """Model-independent token estimate used for budgets"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+def count_tokens(text, model=MODEL_NAME):
+    """Number of tokens in text for model (for accounting)"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages, model=MODEL_NAME):
+    """Approximate prompt tokens for chat messages (content plus per-message framing)"""
+    return sum(count_tokens(message['content'], model) + 4 for message in messages) + 2
+
+def truncate_to_budget(text, max_tokens):
+    """
+    Trim text to at most max_tokens (estimated), keeping the start and the end.
+
+    Long answers usually open with the definition and close with the
+    conclusion, so the middle is cut and marked with TRUNCATION_MARKER.
+    The cut depends only on the text, never on whether tiktoken has loaded.
+    """
+    if not text or estimate_tokens(text) <= max_tokens:
+        return text
+
+    keep_chars = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER))
+    head = (keep_chars * 2) // 3
+    return text[:head] + TRUNCATION_MARKER + text[len(text) - (keep_chars - head):]
+
+class TokenUsage:
+    """
+    Thread-safe per-call-site counters of calls and input/output tokens, plus
+    the tokens spent over the last window_seconds (a rolling window).
+    """
+
+    def __init__(self, window_seconds=PROCESS_TOKEN_BUDGET_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._sites = {}
+        self._recent = deque()  # (recorded_at, tokens)
+        self._recent_total = 0
+
+    def _prune(self, now):
+        while self._recent and now - self._recent[0][0] > self.window_seconds:
+            self._recent_total -= self._recent.popleft()[1]
+
+    def record(self, call_site, prompt_tokens=0, completion_tokens=0, cached=False):
+        with self._lock:
+            site = self._sites.setdefault(call_site, {
+                'calls': 0, 'cache_hits': 0, 'prompt_tokens': 0, 'completion_tokens': 0
+            })
+            site['calls'] += 1
+            if cached:
+                site['cache_hits'] += 1
+            site['prompt_tokens'] += prompt_tokens
+            site['completion_tokens'] += completion_tokens
+            if prompt_tokens or completion_tokens:
+                now = time.monotonic()
+                self._recent.append((now, prompt_tokens + completion_tokens))
+                self._recent_total += prompt_tokens + completion_tokens
+                self._prune(now)
+
+    def report(self):
+        """Snapshot of the counters, with average prompt tokens per provider call"""
+        with self._lock:
+            report = {}
+            for call_site, site in self._sites.items():
+                provider_calls = site['calls'] - site['cache_hits']
+                report[call_site] = {
+                    **site,
+                    'avg_prompt_tokens': site['prompt_tokens'] / provider_calls if provider_calls else 0.0
+                }
+            return report
+
+    def total_tokens(self):
+        """Prompt + completion tokens across all call sites"""
+        with self._lock:
+            return sum(site['prompt_tokens'] + site['completion_tokens'] for site in self._sites.values())
+
+    def recent_tokens(self):
+        """Prompt + completion tokens recorded in the last window_seconds"""
+        with self._lock:
+            self._prune(time.monotonic())
+            return self._recent_total
+
+    def reset(self):
+        with self._lock:
+            self._sites.clear()
+            self._recent.clear()
+            self._recent_total = 0
+
+_usage = TokenUsage()
+
+def record_usage(call_site, prompt_tokens=0, completion_tokens=0, cached=False):
+    """Record one LLM call (cached=True for response-cache hits, which cost no tokens)"""
+    _usage.record(call_site, prompt_tokens, completion_tokens, cached)
+
+def total_tokens_used():
+    """Tokens spent by this process so far"""
+    return _usage.total_tokens()
+
+def recent_tokens_used():
+    """Tokens spent by this process in the last PROCESS_TOKEN_BUDGET_WINDOW_SECONDS"""
+    return _usage.recent_tokens()
+
+def usage_report():
+    """Per-call-site token usage for this process"""
+    return _usage.report()
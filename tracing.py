@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from config import TRACING_ENABLED, TRACE_EXPORT, TRACE_JSONL_PATH, TRACE_RECENT_LIMIT
+
+# The span new spans nest under; None outside a trace, which makes span() a no-op
+_current_span = ContextVar("current_span", default=None)
+
+_recent = deque(maxlen=TRACE_RECENT_LIMIT)
+_export_lock = threading.Lock()
+_export_warned = False
+
+class Span:
+    """One timed stage of a request, with free-form attributes (e.g. token counts)"""
+
+    def __init__(self, name, trace, parent_id, attributes):
+        self.name = name
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start = time.time()
+        self.duration = None
+        self._started = time.perf_counter()
+        self.thread = threading.current_thread().name
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self):
+        self.duration = time.perf_counter() - self._started
+        self.trace.add(self)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "thread": self.thread,
+            "attributes": self.attributes
+        }
+
+class Trace:
+    """All the spans of one user action (submit, follow-up, clarification)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.start = time.time()
+        self._lock = threading.Lock()
+        self.spans = []
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return {"trace_id": self.trace_id, "name": self.name, "start": self.start,
+                "spans": [span.to_dict() for span in spans]}
+
+    def waterfall(self):
+        """Spans in start order as (name, offset_ms, duration_ms, depth, attributes) rows"""
+        spans = self.to_dict()["spans"]
+        depths = {}
+        rows = []
+        for span in spans:
+            depth = depths.get(span["parent_id"], -1) + 1
+            depths[span["span_id"]] = depth
+            rows.append((span["name"], round((span["start"] - self.start) * 1000, 1), span["duration_ms"],
+                         depth, span["attributes"]))
+        return rows
+
+@contextmanager
+def start_trace(name, **attributes):
+    """
+    Trace one user action; spans opened inside it (on this thread, or in
+    work submitted through in_current_context) are recorded under it.
+
+    Yields:
+        Trace: The trace (None when tracing is disabled)
+    """
+    if not TRACING_ENABLED:
+        yield None
+        return
+
+    trace = Trace(name)
+    root = Span(name, trace, None, attributes)
+    root.span_id = trace.trace_id[:16]
+    token = _current_span.set(root)
+    try:
+        yield trace
+    except Exception as e:
+        root.set(error=type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        root.end()
+        _finish(trace)
+
+@contextmanager
+def span(name, **attributes):
+    """Time a stage of the current trace (no-op outside one)"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    current = Span(name, parent.trace, parent.span_id, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+def set_attributes(**attributes):
+    """Attach attributes to the innermost open span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+def record_trace(name, start, duration, **attributes):
+    """
+    Record a one-span trace for work timed outside a with-block (e.g. a
+    Streamlit rerun, which starts in one script run and ends in the next).
+
+    Returns:
+        Trace: The finished trace (None when tracing is disabled)
+    """
+    if not TRACING_ENABLED:
+        return None
+    trace = Trace(name)
+    trace.start = start
+    root = Span(name, trace, None, attributes)
+    root.span_id = trace.trace_id[:16]
+    root.start = start
+    root.duration = duration
+    trace.add(root)
+    _finish(trace)
+    return trace
+
+def in_current_context(fn):
+    """Wrap fn to run in a copy of the caller's context, so spans from pool threads join the caller's trace"""
+    context = copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+def recent_traces():
+    """The last TRACE_RECENT_LIMIT finished traces in this process, oldest first"""
+    return list(_recent)
+
+def _finish(trace):
+    global _export_warned
+    _recent.append(trace)
+    try:
+        if TRACE_EXPORT == "jsonl":
+            _export_jsonl(trace)
+        elif TRACE_EXPORT == "otel":
+            _export_otel(trace)
+    except Exception as e:
+        if not _export_warned:
+            _export_warned = True
+            print(f"Warning: could not export traces ({TRACE_EXPORT}): {e}")
+
+def _export_jsonl(trace):
+    line = json.dumps(trace.to_dict(), default=str)
+    with _export_lock:
+        directory = os.path.dirname(TRACE_JSONL_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(TRACE_JSONL_PATH, "a") as f:
+            f.write(line + "\n")
+
+def _export_otel(trace):
+    """Replay a finished trace through the globally configured OpenTelemetry tracer provider"""
+    from opentelemetry import trace as otel_trace
+
+    tracer = otel_trace.get_tracer("agent-interview-prep")
+    otel_spans = {}
+    # Parents start before their children, so they exist by the time a child needs them
+    for record in trace.to_dict()["spans"]:
+        parent = otel_spans.get(record["parent_id"])
+        context = otel_trace.set_span_in_context(parent) if parent is not None else None
+        start_ns = int(record["start"] * 1e9)
+        otel_span = tracer.start_span(record["name"], context=context, start_time=start_ns,
+                                      attributes={key: value for key, value in record["attributes"].items()
+                                                  if isinstance(value, (str, bool, int, float))})
+        otel_spans[record["span_id"]] = otel_span
+    for record in trace.to_dict()["spans"]:
+        end_ns = int((record["start"] + (record["duration_ms"] or 0) / 1000) * 1e9)
+        otel_spans[record["span_id"]].end(end_time=end_ns)
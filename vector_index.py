@@ -0,0 +1,123 @@
+import numpy as np
+from config import VECTOR_INDEX_BACKEND, ANN_MIN_ROWS, FAISS_IVF_NLIST, FAISS_IVF_NPROBE, FAISS_HNSW_M, FAISS_HNSW_EF_SEARCH
+
+def _import_faiss():
+    """Import faiss on first use; None if it isn't installed"""
+    try:
+        import faiss
+    except ImportError:
+        return None
+    return faiss
+
+INDEX_BACKENDS = ("numpy", "faiss-flat", "faiss-ivf", "faiss-hnsw")
+
+class NumpyIndex:
+    """Exact inner-product search by brute force (the original retrieval path)"""
+    exact = True
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def search(self, queries, k):
+        """Return (scores, ids) of the k best rows per query, best first"""
+        scores = queries @ self.embeddings.T  # (n_queries, n_rows)
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+class FaissIndex:
+    """FAISS inner-product index: flat (exact), IVF or HNSW (approximate)"""
+
+    def __init__(self, embeddings, kind="flat"):
+        faiss = _import_faiss()
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        n_rows, dim = embeddings.shape
+        self.exact = kind == "flat"
+
+        if kind == "flat":
+            self.index = faiss.IndexFlatIP(dim)
+        elif kind == "ivf":
+            # FAISS wants ~39 training points per list; shrink nlist for small banks
+            nlist = max(1, min(FAISS_IVF_NLIST, n_rows // 39))
+            self.quantizer = faiss.IndexFlatIP(dim)
+            self.index = faiss.IndexIVFFlat(self.quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            self.index.train(embeddings)
+            self.index.nprobe = min(FAISS_IVF_NPROBE, nlist)
+        elif kind == "hnsw":
+            self.index = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            self.index.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+        else:
+            raise ValueError(f"Unknown FAISS index kind: {kind}")
+
+        self.index.add(embeddings)
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def search(self, queries, k):
+        """Return (scores, ids) of the k best rows per query, best first (id -1 = no result)"""
+        k = min(k, len(self))
+        scores, ids = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+        # Approximate indexes pad with -1 when they find fewer than k rows
+        scores[ids < 0] = -np.inf
+        return scores, ids
+
+def build_index(embeddings, backend=VECTOR_INDEX_BACKEND):
+    """Build a single index over embeddings with the configured backend"""
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index backend '{backend}', expected one of {INDEX_BACKENDS}")
+    if backend == "numpy":
+        return NumpyIndex(embeddings)
+    if _import_faiss() is None:
+        print(f"Warning: faiss not installed, using numpy index instead of {backend}")
+        return NumpyIndex(embeddings)
+    kind = backend.split("-", 1)[1]
+    # Approximate structures only pay off on large collections; keep small ones exact
+    if len(embeddings) < ANN_MIN_ROWS:
+        kind = "flat"
+    return FaissIndex(embeddings, kind=kind)
+
+def _rows(embeddings, ids):
+    """Select rows, as a view (no copy) when ids is a contiguous range"""
+    if ids[-1] - ids[0] + 1 == len(ids) and np.all(np.diff(ids) == 1):
+        return embeddings[ids[0]:ids[-1] + 1]
+    return embeddings[ids]
+
+class PartitionedIndex:
+    """
+    A full index plus one sub-index per partition key (e.g. concept).
+
+    Restricting a query to a partition is a dict lookup rather than a mask
+    over every row. Sub-index results are mapped back to global row ids.
+    """
+
+    def __init__(self, embeddings, partitions, backend=VECTOR_INDEX_BACKEND):
+        self.full = build_index(embeddings, backend)
+        self.partitions = {
+            key: (build_index(_rows(embeddings, ids), backend), ids)
+            for key, ids in partitions.items() if len(ids)
+        }
+
+    def _index(self, partition):
+        if partition in self.partitions:
+            return self.partitions[partition][0]
+        return self.full
+
+    def is_exact(self, partition=None):
+        return self._index(partition).exact
+
+    def size(self, partition=None):
+        return len(self._index(partition))
+
+    def search(self, queries, k, partition=None):
+        """Search one partition (or everything) and return (scores, global ids)"""
+        if partition in self.partitions:
+            index, ids = self.partitions[partition]
+            scores, local_ids = index.search(queries, k)
+            return scores, np.where(local_ids >= 0, ids[local_ids], -1)
+        return self.full.search(queries, k)